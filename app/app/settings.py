@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -46,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,16 +84,97 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections are borrowed from a pool of every process (core.pool) and returned
+# at the end of each request. With PgBouncer in transaction mode server-side
+# cursors have to be disabled (DB_DISABLE_SERVER_SIDE_CURSORS=1).
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.pool',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        'POOL': {
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 30 * 60)),
+            'CHECK_AFTER': int(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local memory by default, shared backend (e.g. CACHE_BACKEND=django_redis.cache.RedisCache
+# with django-redis installed) can be set with environment variables.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+
+# Metrics of requests, shared by processes of a server through files in METRICS_DIR
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+
+# Profiling of requests sent by admins with X-Profile header and of a random
+# sample of PROFILING_SAMPLE_RATE (0-1) of all requests, see core.profiling
+
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+# default in temporary directory, the application directory may not be writable
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+PROFILE_KEEP = 100
+
+
+# Token authentication
+# Users of tokens are cached in memory of every process, tokens never expire
+# unless TOKEN_EXPIRE_AFTER environment variable is set to number of seconds.
+
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_EXPIRE_AFTER = (
+    timedelta(seconds=int(os.environ['TOKEN_EXPIRE_AFTER']))
+    if os.environ.get('TOKEN_EXPIRE_AFTER') else None
+)
+
+
+# Concurrency
+# Independent queries of composite responses run in a pool of QUERY_THREADS.
+# Served by ASGI (app/asgi.py sets ASYNC_VIEWS=1) API views run as async views
+# in a pool of VIEW_THREADS, the number of requests served at once by a worker.
+
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+VIEW_THREADS = int(os.environ.get('VIEW_THREADS', 16))
+QUERY_THREADS = int(os.environ.get('QUERY_THREADS', 8))
+
+# every view and query thread can hold a connection at once
+DATABASES['default']['POOL']['MAX_SIZE'] = int(
+    os.environ.get('DB_POOL_SIZE', VIEW_THREADS + QUERY_THREADS))
+
+
+# Files of recommendation models built by management commands
+
+MODEL_DATA_DIR = os.environ.get('MODEL_DATA_DIR', str(BASE_DIR / 'model_data'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
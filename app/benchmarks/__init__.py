@@ -0,0 +1,5 @@
+"""
+Benchmarks of the API: synthetic data generator, load runner and
+comparison of saved results. Scripts are run with runscript, e.g.
+`python manage.py runscript benchmarks.generate_data`.
+"""
@@ -0,0 +1,55 @@
+"""
+Compare results of two runs of benchmarks.run_load.
+"""
+import json
+
+
+COLUMNS = [
+    ('req/s', lambda result: result['throughput']),
+    ('p50 ms', lambda result: result['latency_ms']['p50']),
+    ('p95 ms', lambda result: result['latency_ms']['p95']),
+    ('p99 ms', lambda result: result['latency_ms']['p99']),
+]
+
+
+def run(*args):
+    """
+    Print throughput and latency percentiles of scenarios of two results
+    files with relative change of the second one.
+
+    Script arguments (--script-args):
+        <base.json> <new.json>
+    """
+    if len(args) != 2:
+        raise SystemExit('Expected two results files: base and new.')
+    base, new = [load(path) for path in args]
+    for name, results in [('base', base), ('new', new)]:
+        dirty = ' with changes' if results['dirty'] else ''
+        print(f"{name}: {results['commit']}{dirty} {results['label']} "
+              f"started {results['started']}, dataset {results['dataset']}")
+    if base['dataset'] != new['dataset'] or base['options']['concurrency'] != new['options']['concurrency']:
+        print('Warning: runs differ in dataset or concurrency.')
+
+    header = f"{'scenario':<22}" + ''.join(f'{title:>28}' for title, _ in COLUMNS)
+    print(header)
+    for scenario, new_result in new['scenarios'].items():
+        base_result = base['scenarios'].get(scenario)
+        if base_result is None:
+            continue
+        cells = []
+        for _, value in COLUMNS:
+            before, after = value(base_result), value(new_result)
+            cells.append(f'{before:>9.1f} -> {after:>7.1f} {change(before, after):>7}')
+        print(f'{scenario:<22}' + ''.join(f'{cell:>28}' for cell in cells))
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def change(before, after):
+    """Return relative change as signed percentage."""
+    if not before:
+        return ''
+    return f'{(after - before) / before * 100:+.0f}%'
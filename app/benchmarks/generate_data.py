@@ -0,0 +1,327 @@
+"""
+Generate synthetic catalog of movies, artists, users and ratings.
+"""
+import csv
+import io
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.bulk import CatalogResolver, artist_slug, movie_slug, reserve_ids
+from core.cache import bump_generation
+from core.charts import refresh_charts
+from core.models import Artist, Movie, Rating, MAX_RATING, MIN_RATING, empty_histogram
+from core.ratings import recompute_rating_totals
+from core.search import update_search_vectors
+from movie.autocomplete import bump_version
+
+
+DEFAULT_MOVIES = 100000
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_SKEW = 1.0
+# activity of users is less skewed than popularity of movies
+DEFAULT_USER_SKEW = 0.7
+DEFAULT_SEED = 42
+# users of generated ratings, created once and reused by later runs
+USER_DOMAIN = '@bench.example.com'
+USER_EMAIL = 'user{}' + USER_DOMAIN
+USER_PASSWORD = 'benchmark'
+
+GENRES = [
+    'Drama', 'Comedy', 'Action', 'Thriller', 'Romance', 'Crime', 'Adventure',
+    'Horror', 'Mystery', 'Sci-Fi', 'Fantasy', 'Animation', 'Family',
+    'Biography', 'History', 'War', 'Music', 'Sport', 'Western', 'Film-Noir',
+]
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael',
+    'Linda', 'William', 'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan',
+    'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen', 'Anna',
+    'Piotr', 'Katarzyna', 'Krzysztof', 'Agnieszka', 'Akira', 'Yuki', 'Hans',
+    'Ingrid', 'Pedro', 'Lucia', 'Marcel', 'Claire', 'Ivan', 'Olga', 'Omar',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller',
+    'Davis', 'Rodriguez', 'Martinez', 'Wilson', 'Anderson', 'Taylor',
+    'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson', 'White',
+    'Nowak', 'Kowalski', 'Wisniewski', 'Tanaka', 'Suzuki', 'Schmidt',
+    'Muller', 'Bergman', 'Almodovar', 'Dubois', 'Petrov', 'Hassan', 'Rossi',
+]
+ADJECTIVES = [
+    'Silent', 'Last', 'Dark', 'Golden', 'Broken', 'Hidden', 'Lost', 'Wild',
+    'Eternal', 'Crimson', 'Frozen', 'Secret', 'Little', 'Great', 'Final',
+    'Burning', 'Distant', 'Forgotten', 'Midnight', 'Endless', 'Electric',
+]
+NOUNS = [
+    'River', 'City', 'Night', 'Dream', 'Road', 'Empire', 'Garden', 'Storm',
+    'Kingdom', 'Shadow', 'Heart', 'Island', 'Mountain', 'Machine', 'Summer',
+    'Winter', 'Promise', 'Stranger', 'Journey', 'Mirror', 'Horizon', 'Ghost',
+]
+VERBS = [
+    'discovers', 'fights', 'escapes', 'searches for', 'protects', 'betrays',
+    'returns to', 'falls for', 'hunts', 'defends', 'uncovers', 'loses',
+]
+PEOPLE = [
+    'detective', 'young woman', 'retired soldier', 'family', 'teacher',
+    'scientist', 'gang', 'farmer', 'pilot', 'journalist', 'boy', 'queen',
+]
+COMMENTS = [
+    'Great movie!', 'Not my cup of tea.', 'Masterpiece.', 'Too long.',
+    'Would watch again.', 'Overrated.', 'Beautiful cinematography.',
+    'Weak ending.', 'Brilliant acting.', 'Boring.',
+]
+
+
+def run(*args):
+    """
+    Replace movies and artists with a synthetic catalog and rate it.
+    Popularity of movies, artists and genres follows Zipf's law: the k-th
+    most popular one is rated (or cast) with probability proportional to
+    1/k^skew, the k-th most active user rates with probability proportional
+    to 1/k^user_skew. Apart from ids, data is the same for the same arguments.
+
+    Optional script arguments (--script-args):
+        movies=<n>      number of movies (default 100000)
+        artists=<n>     number of artists (default movies / 2)
+        users=<n>       number of users giving ratings (default movies / 10)
+        ratings=<n>     number of ratings (default movies * 10)
+        skew=<s>        exponent of Zipf's law of popularity (default 1.0)
+        user_skew=<s>   exponent of Zipf's law of activity of users (default 0.7)
+        seed=<n>        seed of random numbers (default 42)
+        chunk_size=<n>  number of rows written in one transaction
+    """
+    options = {
+        'skew': DEFAULT_SKEW,
+        'user_skew': DEFAULT_USER_SKEW,
+        'seed': DEFAULT_SEED,
+        'chunk_size': DEFAULT_CHUNK_SIZE,
+    }
+    for arg in args:
+        key, _, value = arg.partition('=')
+        options[key] = float(value) if key.endswith('skew') else int(value)
+    movies = options.get('movies', DEFAULT_MOVIES)
+    artists = options.get('artists', max(movies // 2, 1))
+    users = options.get('users', max(movies // 10, 1))
+    ratings = options.get('ratings', movies * 10)
+
+    generator = CatalogGenerator(
+        options['seed'], options['skew'], options['user_skew'], options['chunk_size'])
+    start = time.perf_counter()
+    generator.clear()
+    generator.stage('users', generator.create_users, users)
+    generator.stage('artists', generator.create_artists, artists)
+    generator.stage('movies', generator.create_movies, movies)
+    generator.stage('ratings', generator.create_ratings, ratings)
+    generator.stage('rating statistics and charts', generator.finish)
+    bump_generation()
+    bump_version()
+    print(f'Generated {movies} movies, {artists} artists, {users} users and '
+          f'{ratings} ratings in {time.perf_counter() - start:.1f}s')
+    print('Similar movies are built by build_similar_movies and build_content_model commands.')
+
+
+class ZipfSampler:
+    """
+    Draw indexes from 0 to n - 1, the k-th most popular with probability
+    proportional to 1/k^skew. Popularity ranks are shuffled, so popular
+    items are spread over all ids.
+    """
+
+    def __init__(self, rng, n, skew):
+        self.rng = rng
+        self.cdf = np.cumsum(1 / np.arange(1, n + 1, dtype=np.float64) ** skew)
+        self.cdf /= self.cdf[-1]
+        self.ranked = rng.permutation(n)
+
+    def sample(self, size):
+        ranks = np.searchsorted(self.cdf, self.rng.random(size), side='right')
+        return self.ranked[np.minimum(ranks, len(self.ranked) - 1)]
+
+
+def copy_rows(table, columns, rows):
+    """Write rows to table with COPY."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def chunks(count, chunk_size):
+    """Yield sizes of chunks of count rows."""
+    for offset in range(0, count, chunk_size):
+        yield min(chunk_size, count - offset)
+
+
+class CatalogGenerator:
+    """Write synthetic rows in chunks, remembering ids of written rows."""
+
+    def __init__(self, seed, skew, user_skew, chunk_size):
+        self.rng = np.random.default_rng(seed)
+        self.skew = skew
+        self.user_skew = user_skew
+        self.chunk_size = chunk_size
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.artist_ids = np.empty(0, dtype=np.int64)
+        self.movie_ids = np.empty(0, dtype=np.int64)
+
+    def stage(self, name, function, *args):
+        print(f'Generating {name}...')
+        start = time.perf_counter()
+        function(*args)
+        print(f'Generated {name} in {time.perf_counter() - start:.1f}s')
+
+    def clear(self):
+        """Remove movies with their ratings and artists, genres and users are kept."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'TRUNCATE {Movie._meta.db_table}, {Artist._meta.db_table} CASCADE')
+
+    def create_users(self, count):
+        """Create missing users of ratings, all with password USER_PASSWORD."""
+        User = get_user_model()
+        emails = [USER_EMAIL.format(number) for number in range(count)]
+        existing = dict(User.objects.filter(
+            email__endswith=USER_DOMAIN).values_list('email', 'id'))
+        missing = [email for email in emails if email not in existing]
+        password = make_password(USER_PASSWORD)
+        for offset in range(0, len(missing), self.chunk_size):
+            batch = missing[offset:offset + self.chunk_size]
+            ids = reserve_ids(User, len(batch))
+            with transaction.atomic():
+                copy_rows(
+                    User._meta.db_table,
+                    ['id', 'password', 'is_superuser', 'email', 'name', 'is_active', 'is_staff'],
+                    ([user_id, password, False, email, email.split('@')[0], True, False]
+                     for user_id, email in zip(ids, batch)))
+            existing.update(zip(batch, ids))
+        self.user_ids = np.array([existing[email] for email in emails], dtype=np.int64)
+
+    def create_artists(self, count):
+        artist_ids = []
+        for size in chunks(count, self.chunk_size):
+            ids = reserve_ids(Artist, size)
+            first_names = self.rng.choice(FIRST_NAMES, size)
+            last_names = self.rng.choice(LAST_NAMES, size)
+            with transaction.atomic():
+                copy_rows(
+                    Artist._meta.db_table, ['id', 'first_name', 'last_name', 'slug'],
+                    ([artist_id, first, last, artist_slug(first, last, artist_id)]
+                     for artist_id, first, last in zip(ids, first_names, last_names)))
+            artist_ids += ids
+        self.artist_ids = np.array(artist_ids, dtype=np.int64)
+
+    def titles(self, size):
+        adjectives = self.rng.choice(ADJECTIVES, size)
+        nouns = self.rng.choice(NOUNS, (size, 2))
+        patterns = self.rng.integers(0, 4, size)
+        titles = []
+        for adjective, (noun, other), pattern in zip(adjectives, nouns, patterns):
+            if pattern == 0:
+                titles.append(f'The {adjective} {noun}')
+            elif pattern == 1:
+                titles.append(f'{noun} of the {other}')
+            elif pattern == 2:
+                titles.append(f'{adjective} {noun}')
+            else:
+                titles.append(f'{adjective} {noun} {self.rng.integers(2, 5)}')
+        return titles
+
+    def overviews(self, size):
+        people = self.rng.choice(PEOPLE, (size, 2))
+        verbs = self.rng.choice(VERBS, size)
+        adjectives = self.rng.choice(ADJECTIVES, size)
+        nouns = self.rng.choice(NOUNS, size)
+        return [
+            f'A {person} {verb} the {adjective.lower()} {noun.lower()} '
+            f'with the help of a {other}.'
+            for (person, other), verb, adjective, noun in zip(people, verbs, adjectives, nouns)
+        ]
+
+    def create_movies(self, count):
+        """Create movies with 1-3 genres, a director and up to 4 actors."""
+        genre_ids = CatalogResolver().genre_ids(GENRES)
+        genres = np.array([genre_ids[genre] for genre in GENRES], dtype=np.int64)
+        genre_sampler = ZipfSampler(self.rng, len(genres), self.skew)
+        director_sampler = ZipfSampler(self.rng, len(self.artist_ids), self.skew)
+        actor_sampler = ZipfSampler(self.rng, len(self.artist_ids), self.skew)
+        now = timezone.now()
+        histogram = '{' + ','.join(map(str, empty_histogram())) + '}'
+
+        movie_ids = []
+        for size in chunks(count, self.chunk_size):
+            ids = reserve_ids(Movie, size)
+            titles = self.titles(size)
+            # most movies are recent
+            years = np.maximum(2023 - self.rng.exponential(20, size).astype(int), 1920)
+            movie_genres = genres[genre_sampler.sample((size, 3))]
+            genre_counts = self.rng.integers(1, 4, size)
+            directors = self.artist_ids[director_sampler.sample(size)]
+            actors = self.artist_ids[actor_sampler.sample((size, 4))]
+
+            with transaction.atomic():
+                copy_rows(
+                    Movie._meta.db_table,
+                    ['id', 'title', 'year', 'overview', 'created', 'updated', 'modified',
+                     'rating_sum', 'rating_count', 'rating_histogram', 'slug'],
+                    ([movie_id, title, year, overview, now.date(), now.date(), now,
+                      0, 0, histogram, movie_slug(title, movie_id)]
+                     for movie_id, title, year, overview
+                     in zip(ids, titles, years, self.overviews(size))))
+                copy_rows(
+                    Movie.genre.through._meta.db_table, ['movie_id', 'genre_id'],
+                    ([movie_id, genre_id]
+                     for movie_id, row, genre_count in zip(ids, movie_genres, genre_counts)
+                     for genre_id in dict.fromkeys(row[:genre_count])))
+                copy_rows(
+                    Movie.director.through._meta.db_table, ['movie_id', 'artist_id'],
+                    zip(ids, directors))
+                copy_rows(
+                    Movie.actors.through._meta.db_table, ['movie_id', 'artist_id'],
+                    ([movie_id, artist_id]
+                     for movie_id, row in zip(ids, actors)
+                     for artist_id in dict.fromkeys(row)))
+                update_search_vectors(ids)
+            movie_ids += ids
+            print(f'{len(movie_ids)} movies generated')
+        self.movie_ids = np.array(movie_ids, dtype=np.int64)
+
+    def create_ratings(self, count):
+        """
+        Create ratings of popular movies by active users more often.
+        Every movie has its own quality, its ratings are scattered around it.
+        """
+        movie_sampler = ZipfSampler(self.rng, len(self.movie_ids), self.skew)
+        user_sampler = ZipfSampler(self.rng, len(self.user_ids), self.user_skew)
+        quality = self.rng.normal(6.5, 1.2, len(self.movie_ids))
+        now = timezone.now().isoformat()
+
+        created = 0
+        for size in chunks(count, self.chunk_size):
+            movies = movie_sampler.sample(size)
+            values = np.clip(
+                np.rint(quality[movies] + self.rng.normal(0, 1.5, size)),
+                MIN_RATING, MAX_RATING).astype(int)
+            comments = np.where(
+                self.rng.random(size) < 0.1, self.rng.choice(COMMENTS, size), None)
+            with transaction.atomic():
+                copy_rows(
+                    Rating._meta.db_table,
+                    ['movie_id_id', 'user_id', 'rating', 'comment', 'modified'],
+                    ([movie_id, user_id, value, comment, now]
+                     for movie_id, user_id, value, comment in zip(
+                         self.movie_ids[movies], self.user_ids[user_sampler.sample(size)],
+                         values, comments)))
+            created += size
+            print(f'{created} ratings generated')
+
+    def finish(self):
+        """Rebuild rating totals and charts and refresh statistics of planner."""
+        recompute_rating_totals()
+        refresh_charts()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
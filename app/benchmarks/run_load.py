@@ -0,0 +1,316 @@
+"""
+Run scripted load scenarios against a running API server.
+"""
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from itertools import accumulate
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from benchmarks.generate_data import USER_DOMAIN
+from core.models import Artist, Genre, Movie, Rating
+
+
+DEFAULT_URL = 'http://127.0.0.1:8000'
+DEFAULT_DURATION = 10
+DEFAULT_WARMUP = 2
+DEFAULT_CONCURRENCY = 8
+DEFAULT_USERS = 100
+DEFAULT_SEED = 42
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+# number of the most rated movies requested by scenarios
+POPULAR_MOVIES = 10000
+PERCENTILES = [50, 95, 99]
+
+
+class Inputs:
+    """
+    Slugs, genres, words and tokens requested by scenarios. Movies are
+    ranked by number of ratings and requested following Zipf's law, like
+    the ratings themselves, so caches see a realistic mix of hot and cold
+    movies.
+    """
+
+    def __init__(self, users):
+        movies = list(Movie.objects.order_by('-rating_count', 'id').values_list(
+            'id', 'slug', 'title')[:POPULAR_MOVIES])
+        if not movies:
+            raise SystemExit('No movies, generate them with benchmarks.generate_data first.')
+        self.movie_slugs = [slug for _, slug, _ in movies]
+        self.movie_weights = list(accumulate(1 / rank for rank in range(1, len(movies) + 1)))
+
+        movie_ids = [movie_id for movie_id, _, _ in movies[:1000]]
+        self.artist_slugs = list(dict.fromkeys(Artist.objects.filter(
+            id__in=Movie.director.through.objects.filter(
+                movie_id__in=movie_ids).values('artist_id')
+        ).exclude(slug=None).values_list('slug', flat=True)))
+        self.genres = list(Genre.objects.values_list('genre', flat=True))
+        words = {word for _, _, title in movies for word in title.split() if len(word) > 3}
+        self.words = sorted(words)
+        self.tokens = self.create_tokens(users)
+
+    def create_tokens(self, count):
+        """Return new tokens of generated users, replacing their old ones."""
+        User = get_user_model()
+        user_ids = list(User.objects.filter(
+            email__endswith=USER_DOMAIN).order_by('id').values_list(
+            'id', flat=True)[:count])
+        if not user_ids:
+            raise SystemExit('No users, generate them with benchmarks.generate_data first.')
+        Token.objects.filter(user_id__in=user_ids).delete()
+        return [Token.objects.create(user_id=user_id).key for user_id in user_ids]
+
+    def movie(self, rng):
+        return rng.choices(self.movie_slugs, cum_weights=self.movie_weights)[0]
+
+
+def movies_list(inputs, rng):
+    return 'GET', '/api/movie/movies/', None, None
+
+
+def movies_by_title(inputs, rng):
+    return 'GET', '/api/movie/movies/?order_by=title', None, None
+
+
+def movies_by_genre(inputs, rng):
+    query = urlencode({'genre': rng.choice(inputs.genres), 'order_by': 'rating'})
+    return 'GET', f'/api/movie/movies/?{query}', None, None
+
+
+def movies_title_filter(inputs, rng):
+    query = urlencode({'title': rng.choice(inputs.words)[:4]})
+    return 'GET', f'/api/movie/movies/?{query}', None, None
+
+
+def movies_search(inputs, rng):
+    query = urlencode({'search': rng.choice(inputs.words)})
+    return 'GET', f'/api/movie/movies/?{query}', None, None
+
+
+def movie_detail(inputs, rng):
+    return 'GET', f'/api/movie/movies/{inputs.movie(rng)}/', None, None
+
+
+def movie_ratings(inputs, rng):
+    return 'GET', f'/api/movie/movies/{inputs.movie(rng)}/ratings/', None, None
+
+
+def artist_detail(inputs, rng):
+    return 'GET', f'/api/movie/artist/{rng.choice(inputs.artist_slugs)}/', None, None
+
+
+def add_rating(inputs, rng):
+    body = {'rating': rng.randint(1, 10), 'comment': ''}
+    return ('POST', f'/api/movie/movies/{inputs.movie(rng)}/add_rating/', body,
+            rng.choice(inputs.tokens))
+
+
+def user_ratings(inputs, rng):
+    return 'GET', '/api/user/ratings/', None, rng.choice(inputs.tokens)
+
+
+# scenarios run one after another in this order, writes last
+SCENARIOS = {
+    function.__name__: function for function in [
+        movies_list, movies_by_title, movies_by_genre, movies_title_filter,
+        movies_search, movie_detail, movie_ratings, artist_detail,
+        user_ratings, add_rating,
+    ]
+}
+
+
+def run(*args):
+    """
+    Run load scenarios against API server and save results to JSON file.
+    Each scenario sends requests from `concurrency` threads, every thread
+    sends its next request as soon as it gets response, for `warmup`
+    seconds not measured and `duration` seconds measured. Results hold
+    throughput, latency percentiles and statuses of every scenario with
+    commit, machine and dataset size, see benchmarks.compare.
+
+    Optional script arguments (--script-args):
+        url=<url>           address of API server (default http://127.0.0.1:8000)
+        scenarios=<a,b>     names of scenarios to run (default all)
+        duration=<s>        measured seconds of scenario (default 10)
+        warmup=<s>          seconds of scenario before measuring (default 2)
+        concurrency=<n>     number of concurrent clients (default 8)
+        users=<n>           number of generated users sending requests (default 100)
+        seed=<n>            seed of random choice of requests (default 42)
+        label=<text>        description of run saved with results
+        output=<path>       results file (default benchmarks/results/<time>-<commit>.json)
+    """
+    options = {
+        'url': DEFAULT_URL,
+        'scenarios': ','.join(SCENARIOS),
+        'duration': DEFAULT_DURATION,
+        'warmup': DEFAULT_WARMUP,
+        'concurrency': DEFAULT_CONCURRENCY,
+        'users': DEFAULT_USERS,
+        'seed': DEFAULT_SEED,
+        'label': '',
+        'output': None,
+    }
+    for arg in args:
+        key, _, value = arg.partition('=')
+        if key not in options:
+            raise SystemExit(f'Unknown option {key}, expected one of {", ".join(options)}.')
+        options[key] = type(options[key])(value) if options[key] is not None else value
+    names = options['scenarios'].split(',')
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f'Unknown scenarios {", ".join(unknown)}.')
+
+    inputs = Inputs(options['users'])
+    commit, dirty = git_commit()
+    results = {
+        'label': options['label'],
+        'started': timezone.now().isoformat(),
+        'commit': commit,
+        'dirty': dirty,
+        'options': options,
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'dataset': dataset_size(),
+        'scenarios': dict(),
+    }
+    for name in names:
+        print(f'Running {name}...')
+        results['scenarios'][name] = result = run_scenario(
+            options['url'], SCENARIOS[name], inputs, options)
+        latency = result['latency_ms']
+        print(f"{name}: {result['throughput']:.1f} req/s, p50 {latency['p50']:.1f}ms, "
+              f"p95 {latency['p95']:.1f}ms, p99 {latency['p99']:.1f}ms, "
+              f"{result['errors']} errors")
+
+    path = options['output'] or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results saved to {path}')
+
+
+def run_scenario(url, scenario, inputs, options):
+    """Send requests of scenario from concurrent clients and return their statistics."""
+    start = time.perf_counter()
+    measured_from = start + options['warmup']
+    deadline = measured_from + options['duration']
+    samples = [[] for _ in range(options['concurrency'])]
+    threads = [
+        threading.Thread(target=client, args=(
+            url, scenario, inputs, random.Random(f"{options['seed']}-{number}"),
+            measured_from, deadline, samples[number]))
+        for number in range(options['concurrency'])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statistics([sample for thread in samples for sample in thread], options['duration'])
+
+
+def client(url, scenario, inputs, rng, measured_from, deadline, samples):
+    """Send requests over one keep-alive connection until deadline, saving (latency, status)."""
+    parts = urlsplit(url)
+    connection_class = (
+        http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection)
+    server = None
+    while True:
+        method, path, body, token = scenario(inputs, rng)
+        headers = {'Accept': 'application/json'}
+        if token is not None:
+            headers['Authorization'] = f'Token {token}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if server is None:
+            server = connection_class(parts.netloc, timeout=30)
+
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        try:
+            server.request(method, parts.path.rstrip('/') + path, body, headers)
+            response = server.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            server.close()
+            server = None
+            status = 0
+        if start >= measured_from:
+            samples.append((time.perf_counter() - start, status))
+    if server is not None:
+        server.close()
+
+
+def percentile(ordered, percent):
+    """Return nearest-rank percentile of sorted list."""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def statistics(samples, duration):
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    statuses = dict()
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if not 200 <= status < 400),
+        'statuses': statuses,
+        'throughput': round(len(samples) / duration, 2),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            **{f'p{percent}': round(percentile(latencies, percent), 3)
+               for percent in PERCENTILES},
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+def git_commit():
+    """Return short hash of checked out commit and whether tree has changes."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def dataset_size():
+    """Return estimated numbers of rows of tables, counting large tables is slow."""
+    models = {
+        'movies': Movie,
+        'artists': Artist,
+        'ratings': Rating,
+        'users': get_user_model(),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s)',
+            [[model._meta.db_table for model in models.values()]])
+        rows = dict(cursor.fetchall())
+    return {name: rows.get(model._meta.db_table) for name, model in models.items()}
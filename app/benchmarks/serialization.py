@@ -0,0 +1,138 @@
+"""
+Compare cost of list responses built by DRF serializers and by fast serializers.
+"""
+import json
+import os
+import time
+
+from django.db import connection
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+
+from benchmarks.run_load import RESULTS_DIR, git_commit
+from core.models import Artist, ChartEntry, Chart, Movie, Rating, RATING_ORDERING
+from core.renderers import JSONRenderer
+from movie import fast_serializers, serializers
+from movie.artist_views import filmography
+
+
+DEFAULT_ROWS = 100
+DEFAULT_REPEAT = 20
+
+
+def run(*args):
+    """
+    Build and render the same lists of rows with DRF serializers and renderer
+    (current path) and with fast serializers and orjson renderer (fast path),
+    print time per row of both and check that the responses are identical
+    byte for byte and equivalent as JSON (see core.renderers for floats).
+
+    Optional script arguments (--script-args):
+        rows=<n>        number of rows of every list (default 100)
+        repeat=<n>      number of measured repetitions (default 20)
+        output=<path>   results file (default benchmarks/results/serialization-<time>-<commit>.json)
+    """
+    options = {'rows': DEFAULT_ROWS, 'repeat': DEFAULT_REPEAT, 'output': None}
+    for arg in args:
+        key, _, value = arg.partition('=')
+        options[key] = value if key == 'output' else int(value)
+
+    commit, dirty = git_commit()
+    results = {
+        'started': timezone.now().isoformat(),
+        'commit': commit,
+        'dirty': dirty,
+        'options': options,
+        'cases': dict(),
+    }
+    print(f"{'case':<12}{'path':<9}{'rows':>6}{'queries':>9}"
+          f"{'data us/row':>13}{'render us/row':>15}{'total us/row':>14}{'identical':>11}{'equivalent':>12}")
+    for name, (current, fast) in cases(options['rows']).items():
+        measured = {
+            'current': measure(current, DRFJSONRenderer(), options['repeat']),
+            'fast': measure(fast, JSONRenderer(), options['repeat']),
+        }
+        current_content = measured['current'].pop('content')
+        fast_content = measured['fast'].pop('content')
+        identical = current_content == fast_content
+        equivalent = json.loads(current_content) == json.loads(fast_content)
+        for path, result in measured.items():
+            print(f"{name:<12}{path:<9}{result['rows']:>6}{result['queries']:>9}"
+                  f"{result['data_us_per_row']:>13.1f}{result['render_us_per_row']:>15.1f}"
+                  f"{result['total_us_per_row']:>14.1f}{str(identical):>11}{str(equivalent):>12}")
+        results['cases'][name] = {**measured, 'identical': identical, 'equivalent': equivalent}
+
+    path = options['output'] or os.path.join(
+        RESULTS_DIR, f"serialization-{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results saved to {path}')
+
+
+def cases(rows):
+    """
+    Return dict of case -> (current, fast) functions returning data of the
+    same list of rows, queries included.
+    """
+    movies = Movie.objects.order_by(RATING_ORDERING.desc(), '-id')
+    movie_id = Movie.objects.order_by('-rating_count').values_list('id', flat=True).first()
+    ratings = Rating.objects.filter(movie_id=movie_id).order_by('-id')
+    artist_id = Artist.objects.annotate(movies=Count('movie')).order_by(
+        '-movies').values_list('id', flat=True).first()
+    films = filmography(artist_id).order_by(F('year').desc(), F('id').desc())
+    entries = ChartEntry.objects.filter(chart__key=Chart.OVERALL).order_by('-score', '-id')
+
+    return {
+        'movies': (
+            lambda: serializers.MovieSerializer(
+                movies.prefetch_related('genre', 'director', 'actors')[:rows], many=True).data,
+            lambda: fast_serializers.movies(
+                list(movies.values(*fast_serializers.MOVIE_FIELDS)[:rows])),
+        ),
+        'ratings': (
+            lambda: serializers.RatingSerializer(
+                ratings.select_related('user')[:rows], many=True).data,
+            lambda: fast_serializers.ratings(
+                ratings.values(*fast_serializers.RATING_FIELDS)[:rows]),
+        ),
+        'filmography': (
+            lambda: serializers.FilmographyMovieSerializer(films[:rows], many=True).data,
+            lambda: fast_serializers.filmography(
+                films.values(*fast_serializers.FILMOGRAPHY_FIELDS)[:rows]),
+        ),
+        'chart': (
+            lambda: serializers.ChartEntrySerializer(
+                entries.select_related('movie')[:rows], many=True).data,
+            lambda: fast_serializers.chart_entries(
+                entries.values(*fast_serializers.CHART_ENTRY_FIELDS)[:rows]),
+        ),
+    }
+
+
+def measure(build, renderer, repeat):
+    """Return number of rows and queries and time per row of building and rendering data."""
+    with CaptureQueriesContext(connection) as queries:
+        data = build()
+    content = renderer.render(data)
+    data_time = render_time = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = build()
+        built = time.perf_counter()
+        renderer.render(data)
+        data_time += built - start
+        render_time += time.perf_counter() - built
+
+    rows = max(len(data), 1)
+    per_row = 1e6 / (repeat * rows)
+    return {
+        'rows': len(data),
+        'queries': len(queries),
+        'data_us_per_row': round(data_time * per_row, 2),
+        'render_us_per_row': round(render_time * per_row, 2),
+        'total_us_per_row': round((data_time + render_time) * per_row, 2),
+        'content': content,
+    }
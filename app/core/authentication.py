@@ -0,0 +1,150 @@
+"""
+Token authentication with users cached in memory of the process.
+
+DRF TokenAuthentication joins tokens with users on every request. Here
+users of recently used tokens are kept in a bounded LRU cache with a time
+to live, so requests of active users are authenticated without a query.
+
+Saving or deleting a user or deleting their token, wherever it happens
+(API, admin, shell), invalidates cached tokens of the user once the
+transaction commits. This process drops them immediately, other
+processes see a counter in the shared cache change and clear their
+caches within INVALIDATION_CHECK_INTERVAL seconds. Queryset update()
+sends no signals, so it needs invalidate_user to be called.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+INVALIDATION_KEY = 'auth:invalidations'
+INVALIDATION_CHECK_INTERVAL = 1
+
+
+class TTLCache:
+    """Thread safe LRU cache with at most `size` entries living `timeout` seconds."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_matching(self, predicate):
+        """Delete entries with value for which predicate is true."""
+        with self.lock:
+            for key in [key for key, (value, _) in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_tokens = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT)
+_state = {'checked': 0, 'invalidations': None}
+
+
+def shared_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def check_invalidations():
+    """Clear cached tokens when other process invalidated some since the last check."""
+    now = time.monotonic()
+    if now - _state['checked'] < INVALIDATION_CHECK_INTERVAL:
+        return
+    _state['checked'] = now
+    invalidations = shared_cache().get(INVALIDATION_KEY)
+    if invalidations != _state['invalidations']:
+        _tokens.clear()
+        _state['invalidations'] = invalidations
+
+
+def invalidate_user(user_id):
+    """Drop cached tokens of user here and make other processes drop theirs."""
+    _tokens.delete_matching(lambda value: value[0].id == user_id)
+    cache = shared_cache()
+    try:
+        cache.incr(INVALIDATION_KEY)
+    except ValueError:
+        cache.set(INVALIDATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_saved_user(sender, instance, created, update_fields=None, **kwargs):
+    """Invalidate tokens of changed user, logins only update last_login."""
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    transaction.on_commit(lambda: invalidate_user(instance.id))
+
+
+def invalidate_deleted_user(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_user(instance.id))
+
+
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_user(instance.user_id))
+
+
+post_save.connect(invalidate_saved_user, sender=get_user_model())
+post_delete.connect(invalidate_deleted_user, sender=get_user_model())
+post_delete.connect(invalidate_deleted_token, sender=Token)
+
+
+def is_expired(created):
+    """Return True when token created at given time is older than TOKEN_EXPIRE_AFTER."""
+    expire_after = settings.TOKEN_EXPIRE_AFTER
+    return expire_after is not None and timezone.now() - created > expire_after
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication keeping users of tokens in memory. Tokens older
+    than TOKEN_EXPIRE_AFTER are rejected when it is set.
+    """
+
+    def authenticate_credentials(self, key):
+        check_invalidations()
+        cached = _tokens.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cached = (user, token)
+            _tokens.set(key, cached)
+
+        user, token = cached
+        if is_expired(token.created):
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        # views may modify request.user, cached user must stay untouched
+        return copy.copy(user), token
@@ -0,0 +1,141 @@
+"""
+Helpers for set-based bulk writes of catalog data.
+"""
+from django.db import connection
+from django.utils.text import slugify
+
+from core.models import Artist, Genre, Movie
+
+
+def reserve_ids(model, count):
+    """Reserve and return `count` primary keys from the model's sequence."""
+    if count <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+            'FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def artist_slug(first_name, last_name, artist_id):
+    """Return slug for artist, same as the one generated by the API."""
+    return slugify(f"{first_name} {last_name} {artist_id}")
+
+
+def movie_slug(title, movie_id):
+    """Return slug for movie, same as the one generated by the API."""
+    return slugify(f"{title} {movie_id}")
+
+
+class CatalogResolver:
+    """
+    Resolve genre names and artist names to ids with an in-memory map.
+    Missing genres and artists are created in bulk.
+    """
+
+    def __init__(self):
+        self.genres = dict()
+        self.artists = dict()
+
+    def preload(self):
+        """Load all existing genres and artists into the maps."""
+        for genre_id, genre in Genre.objects.values_list('id', 'genre').order_by('-id'):
+            self.genres[genre] = genre_id
+        artists = Artist.objects.values_list(
+            'id', 'first_name', 'last_name').order_by('-id')
+        for artist_id, first_name, last_name in artists.iterator():
+            self.artists[(first_name, last_name)] = artist_id
+
+    def genre_ids(self, names):
+        """Return dict of genre name -> id, creating missing genres."""
+        missing = {name for name in names if name not in self.genres}
+        if missing:
+            found = Genre.objects.filter(genre__in=missing).values_list('id', 'genre')
+            for genre_id, genre in found:
+                self.genres.setdefault(genre, genre_id)
+            missing = sorted(name for name in missing if name not in self.genres)
+            created = Genre.objects.bulk_create(
+                [Genre(genre=name) for name in missing])
+            for genre in created:
+                self.genres[genre.genre] = genre.id
+        return {name: self.genres[name] for name in names}
+
+    def artist_ids(self, names):
+        """
+        Return dict of (first_name, last_name) -> id, creating missing artists.
+        Slugs of created artists are generated before insert.
+        """
+        missing = {name for name in names if name not in self.artists}
+        if missing:
+            found = Artist.objects.filter(
+                first_name__in={first_name for first_name, _ in missing},
+                last_name__in={last_name for _, last_name in missing}
+            ).values_list('id', 'first_name', 'last_name')
+            for artist_id, first_name, last_name in found:
+                self.artists.setdefault((first_name, last_name), artist_id)
+            missing = sorted(name for name in missing if name not in self.artists)
+            ids = reserve_ids(Artist, len(missing))
+            Artist.objects.bulk_create([
+                Artist(
+                    id=artist_id,
+                    first_name=first_name,
+                    last_name=last_name,
+                    slug=artist_slug(first_name, last_name, artist_id)
+                )
+                for artist_id, (first_name, last_name) in zip(ids, missing)
+            ])
+            for artist_id, name in zip(ids, missing):
+                self.artists[name] = artist_id
+        return {name: self.artists[name] for name in names}
+
+
+def create_movies(items, resolver):
+    """
+    Insert movies from validated data of movie serializer with their genres,
+    directors and actors in a constant number of queries.
+    Return created movies and ids of their artists.
+    """
+    genre_ids = resolver.genre_ids(
+        {genre['genre'] for item in items for genre in item.get('genre', [])})
+    artist_ids = resolver.artist_ids({
+        (artist['first_name'], artist['last_name'])
+        for item in items
+        for artist in item.get('director', []) + item.get('actors', [])
+    })
+
+    movie_ids = reserve_ids(Movie, len(items))
+    movies, genre_links, director_links, actor_links = [], [], [], []
+    for movie_id, item in zip(movie_ids, items):
+        movies.append(Movie(
+            id=movie_id,
+            title=item['title'],
+            year=item['year'],
+            overview=item.get('overview'),
+            slug=movie_slug(item['title'], movie_id)
+        ))
+        genre_links += [
+            Movie.genre.through(movie_id=movie_id, genre_id=genre_id)
+            for genre_id in dict.fromkeys(
+                genre_ids[genre['genre']] for genre in item.get('genre', []))
+        ]
+        director_links += [
+            Movie.director.through(movie_id=movie_id, artist_id=artist_id)
+            for artist_id in dict.fromkeys(
+                artist_ids[(artist['first_name'], artist['last_name'])]
+                for artist in item.get('director', []))
+        ]
+        actor_links += [
+            Movie.actors.through(movie_id=movie_id, artist_id=artist_id)
+            for artist_id in dict.fromkeys(
+                artist_ids[(artist['first_name'], artist['last_name'])]
+                for artist in item.get('actors', []))
+        ]
+
+    Movie.objects.bulk_create(movies)
+    Movie.genre.through.objects.bulk_create(genre_links)
+    Movie.director.through.objects.bulk_create(director_links)
+    Movie.actors.through.objects.bulk_create(actor_links)
+    return movies, set(artist_ids.values())
@@ -0,0 +1,118 @@
+"""
+Versioned cache of API responses.
+
+Responses are cached under the slug and current version of the object.
+Changing an object bumps its version, so stale responses are never read
+again and simply expire.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+MOVIE = 'movie'
+ARTIST = 'artist'
+KINDS = [MOVIE, ARTIST]
+GENERATION_KEY = 'response-cache:generation'
+
+
+def response_cache():
+    """Return cache backend used for responses."""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def version_key(kind, slug):
+    return f'response-cache:version:{kind}:{slug}'
+
+
+def new_version():
+    """
+    Return version for object without one, based on current time so it never
+    matches responses cached before the version was evicted.
+    """
+    return time.time_ns()
+
+
+def cached_data(kind, slug, build, variant=''):
+    """
+    Return response data of object, calling `build` only on cache miss.
+    Variants of response (e.g. different ordering) are cached separately
+    but share the version of the object.
+    """
+    cache = response_cache()
+    keys = [GENERATION_KEY, version_key(kind, slug)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = new_version()
+            if not cache.add(key, versions[key], timeout=None):
+                versions[key] = cache.get(key, versions[key])
+
+    generation, version = [versions[key] for key in keys]
+    data_key = f'response-cache:data:{kind}:{slug}:{variant}:{generation}:{version}'
+    data = cache.get(data_key)
+    if data is None:
+        count_event(kind, 'misses')
+        data = build()
+        cache.set(data_key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    else:
+        count_event(kind, 'hits')
+    return data
+
+
+def bump_versions(kind, slugs):
+    """Invalidate cached responses of objects."""
+    cache = response_cache()
+    for slug in slugs:
+        try:
+            cache.incr(version_key(kind, slug))
+        except ValueError:
+            cache.set(version_key(kind, slug), new_version(), timeout=None)
+
+
+def bump_movies(movie_ids):
+    """Invalidate cached responses of movies when transaction commits."""
+    from core.models import Movie
+
+    slugs = list(Movie.objects.filter(id__in=movie_ids).values_list('slug', flat=True))
+    transaction.on_commit(lambda: bump_versions(MOVIE, slugs))
+
+
+def bump_artists(slugs):
+    """Invalidate cached responses of artists when transaction commits."""
+    slugs = list(slugs)
+    transaction.on_commit(lambda: bump_versions(ARTIST, slugs))
+
+
+def bump_generation():
+    """Invalidate all cached responses, used after catalog imports."""
+    cache = response_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, new_version(), timeout=None)
+
+
+def count_event(kind, event):
+    key = f'response-cache:{event}:{kind}'
+    cache = response_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def stats():
+    """Return number of hits and misses per kind of object."""
+    keys = {
+        (kind, event): f'response-cache:{event}:{kind}'
+        for kind in KINDS for event in ['hits', 'misses']
+    }
+    values = response_cache().get_many(keys.values())
+    data = {kind: {'hits': 0, 'misses': 0} for kind in KINDS}
+    for (kind, event), key in keys.items():
+        data[kind][event] = values.get(key, 0)
+    return data
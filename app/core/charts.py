@@ -0,0 +1,63 @@
+"""
+Top charts of movies ranked by Bayesian average of their ratings.
+"""
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.models import Chart, ChartEntry, Genre, Movie
+
+
+def median_rating_count():
+    """Return median number of ratings of rated movies, at least 1."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY rating_count) '
+            f'FROM {Movie._meta.db_table} WHERE rating_count > 0'
+        )
+        median = cursor.fetchone()[0]
+    return max(1, round(median or 0))
+
+
+def refresh_charts(min_votes=None):
+    """
+    Create charts of all genres and decades, remove charts without them
+    and rank all rated movies again with the current mean rating.
+    Minimum votes default to the median number of ratings of rated movies.
+    Return number of charts and of their entries.
+    """
+    totals = Movie.objects.aggregate(
+        rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'))
+    mean = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 0
+    if min_votes is None:
+        min_votes = median_rating_count()
+
+    charts = {Chart.OVERALL: Chart(key=Chart.OVERALL, kind=Chart.OVERALL)}
+    for genre_id in Genre.objects.values_list('id', flat=True):
+        key = f'{Chart.GENRE}:{genre_id}'
+        charts[key] = Chart(key=key, kind=Chart.GENRE, genre_id=genre_id)
+    decades = Movie.objects.filter(year__gt=0).annotate(
+        decade=F('year') / 10 * 10).values_list('decade', flat=True).distinct()
+    for decade in decades:
+        key = f'{Chart.DECADE}:{decade}'
+        charts[key] = Chart(key=key, kind=Chart.DECADE, decade=decade)
+
+    with transaction.atomic():
+        Chart.objects.exclude(key__in=charts).delete()
+        existing = set(Chart.objects.values_list('key', flat=True))
+        Chart.objects.bulk_create(
+            [chart for key, chart in charts.items() if key not in existing])
+        Chart.objects.update(mean=mean, min_votes=min_votes, refreshed=timezone.now())
+        ChartEntry.objects.update_movies()
+    return len(charts), ChartEntry.objects.count()
+
+
+def get_chart(kind, value=None):
+    """Return chart of kind for genre name or decade, None if there is no such chart."""
+    if kind == Chart.OVERALL:
+        return Chart.objects.filter(key=Chart.OVERALL).first()
+    if kind == Chart.GENRE:
+        return Chart.objects.filter(kind=Chart.GENRE, genre__genre=value).first()
+    if kind == Chart.DECADE:
+        return Chart.objects.filter(key=f'{Chart.DECADE}:{value}').first()
+    return None
@@ -0,0 +1,96 @@
+"""
+Concurrent database queries and async serving of sync views.
+
+The ORM of Django 3.2 is synchronous, so concurrency comes from bounded
+thread pools. Independent queries of composite responses run at once in
+the query pool, so the response takes about as long as its slowest query.
+
+Served by ASGI (ASYNC_VIEWS enabled by app/asgi.py), API views are async
+views running the sync DRF views in the view pool instead of the single
+thread Django uses for sync views, so one worker process serves up to
+VIEW_THREADS requests at once while its event loop keeps accepting new ones.
+
+Threads of the pools borrow database connections from the pool of the
+process (core.pool) only while running a view or a query.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.urls import URLResolver
+
+from core.profiling import profiled
+
+
+_query_pool = ThreadPoolExecutor(settings.QUERY_THREADS, thread_name_prefix='query')
+_view_pool = ThreadPoolExecutor(settings.VIEW_THREADS, thread_name_prefix='view')
+
+
+@profiled
+def run_query(function):
+    """Call function in thread of query pool, returning its connection to the pool afterwards."""
+    try:
+        return function()
+    finally:
+        connection.close()
+
+
+def run_concurrently(*functions):
+    """
+    Return list of results of functions called at once, the first one in
+    calling thread and the others in the query pool. Functions should
+    evaluate their querysets, as lazy querysets would be evaluated later
+    by the caller. Inside a transaction functions are called one after
+    another, as other threads would not see its changes.
+    """
+    if connection.in_atomic_block:
+        return [function() for function in functions]
+    # copied context keeps metrics of the request in query threads
+    futures = [
+        _query_pool.submit(contextvars.copy_context().run, run_query, function)
+        for function in functions[1:]
+    ]
+    results = [functions[0]()]
+    return results + [future.result() for future in futures]
+
+
+@profiled
+def run_view(view, request, *args, **kwargs):
+    """Call sync view in thread of view pool with connections handled as per request."""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # templates and lazy content are rendered here, not in the event loop
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Return async view calling sync view in the view pool."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _view_pool, functools.partial(
+                contextvars.copy_context().run, run_view, view, request, *args, **kwargs))
+
+    wrapper.is_async_view = True
+    return wrapper
+
+
+def async_patterns(patterns):
+    """Replace views of url patterns, also included ones, with async views when ASYNC_VIEWS is set."""
+    if not settings.ASYNC_VIEWS:
+        return patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            async_patterns(pattern.url_patterns)
+        elif not getattr(pattern.callback, 'is_async_view', False):
+            pattern.callback = async_view(pattern.callback)
+    return patterns
@@ -0,0 +1,42 @@
+"""
+Conditional GET support for API views.
+"""
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Return quoted ETag built from parts."""
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(value.encode()).hexdigest())
+
+
+def conditional_get(validators):
+    """
+    Decorate view method to answer 304 Not Modified when ETag or
+    Last-Modified returned by view method named `validators` match the
+    request, before the view method does any serialization work.
+    Validators method returns (etag, last modified datetime), either can be None.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = getattr(self, validators)(request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                if etag:
+                    response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,326 @@
+"""
+Content-based similarity of movies.
+
+Movies are described by TF-IDF vectors of overview words, genres and
+artists. Overview is tokenized, stemmed and stripped of stop words by
+Postgres text search with the configuration used by movie search.
+Similarity of two movies is the weighted sum of cosine similarities of
+the three parts, so movies without ratings get neighbours too.
+
+Vocabularies, idf weights and vectors of movies are saved in
+MODEL_DATA_DIR, so movies added later are compared with all movies
+without rebuilding the model. Movies created through the API are added
+in a background thread after their transaction commits: only they are
+vectorized, their similarities are computed in blocks of bounded memory
+and their vectors are appended to the saved model.
+"""
+import fcntl
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import Movie, MovieNeighbour
+from core.search import SEARCH_CONFIG
+from core.similarity import top_products
+
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'content_model.npz'
+# bytes of dense similarities of one block of added movies
+BLOCK_MEMORY = 64 * 2**20
+
+# weight of every part of movie description in similarity
+WEIGHTS = {
+    'overview': 0.5,
+    'genre': 0.2,
+    'cast': 0.3,
+}
+
+# (movie id, term, number of occurrences) of every part of all movies or of movies with given ids
+FEATURE_QUERIES = {
+    'overview': f"""
+        SELECT m.id, t.lexeme, coalesce(array_length(t.positions, 1), 1)
+        FROM {Movie._meta.db_table} AS m
+        CROSS JOIN unnest(
+            to_tsvector(%(config)s::regconfig, coalesce(m.overview, ''))) AS t
+        WHERE %(all)s OR m.id = ANY(%(ids)s)
+    """,
+    'genre': f"""
+        SELECT movie_id, genre_id::text, 1 FROM {Movie.genre.through._meta.db_table}
+        WHERE %(all)s OR movie_id = ANY(%(ids)s)
+    """,
+    'cast': f"""
+        SELECT movie_id, artist_id::text, 1 FROM {Movie.director.through._meta.db_table}
+        WHERE %(all)s OR movie_id = ANY(%(ids)s)
+        UNION
+        SELECT movie_id, artist_id::text, 1 FROM {Movie.actors.through._meta.db_table}
+        WHERE %(all)s OR movie_id = ANY(%(ids)s)
+    """,
+}
+
+TRIM_NEIGHBOURS = f"""
+    DELETE FROM {MovieNeighbour._meta.db_table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY movie_id ORDER BY score DESC) AS position
+            FROM {MovieNeighbour._meta.db_table}
+            WHERE kind = %(kind)s AND movie_id = ANY(%(ids)s)
+        ) AS ranked
+        WHERE position > %(top_k)s
+    )
+"""
+
+
+def model_path():
+    return os.path.join(settings.MODEL_DATA_DIR, MODEL_FILE)
+
+
+def load_features(movie_ids=None):
+    """Return dict of part -> list of (movie id, term, count) of given movies, all by default."""
+    params = {
+        'config': SEARCH_CONFIG,
+        'all': movie_ids is None,
+        'ids': [] if movie_ids is None else [int(movie_id) for movie_id in movie_ids],
+    }
+    features = dict()
+    with connection.cursor() as cursor:
+        for part, sql in FEATURE_QUERIES.items():
+            cursor.execute(sql, params)
+            features[part] = cursor.fetchall()
+    return features
+
+
+def load_movie_ids(movie_ids=None):
+    """Return sorted array of ids of existing movies, of all movies by default."""
+    queryset = Movie.objects.all()
+    if movie_ids is not None:
+        queryset = queryset.filter(id__in=[int(movie_id) for movie_id in movie_ids])
+    return np.fromiter(
+        queryset.order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64
+    )
+
+
+class ContentModel:
+    """Vocabularies and idf weights of parts of movie description with vectors of movies."""
+
+    def __init__(self, movie_ids, vocabularies, idfs, vectors, top_k):
+        self.movie_ids = movie_ids
+        self.vocabularies = vocabularies
+        self.idfs = idfs
+        self.vectors = vectors
+        self.top_k = top_k
+        self.term_indexes = {
+            part: {term: index for index, term in enumerate(terms.tolist())}
+            for part, terms in vocabularies.items()
+        }
+        self.columns = vectors.T.tocsc() if vectors is not None else None
+
+    @classmethod
+    def build(cls, top_k):
+        """Return model built from all movies."""
+        movie_ids = load_movie_ids()
+        features = load_features()
+        vocabularies, idfs = dict(), dict()
+        for part in WEIGHTS:
+            terms, documents = np.unique(
+                np.array([term for _, term, _ in features[part]], dtype=str),
+                return_counts=True)
+            vocabularies[part] = terms
+            idfs[part] = (np.log((1 + len(movie_ids)) / (1 + documents)) + 1).astype(np.float32)
+
+        model = cls(movie_ids, vocabularies, idfs, None, top_k)
+        model.vectors = model.vectorize(movie_ids, features)
+        model.columns = model.vectors.T.tocsc()
+        return model
+
+    def vectorize(self, movie_ids, features):
+        """
+        Return csr matrix with vectors of movies in order of movie ids.
+        Every part is a unit vector scaled by square root of its weight,
+        terms missing in vocabularies are skipped.
+        """
+        positions = {movie_id: index for index, movie_id in enumerate(movie_ids.tolist())}
+        parts = []
+        for part, weight in WEIGHTS.items():
+            indexes = self.term_indexes[part]
+            rows, columns, counts = [], [], []
+            for movie_id, term, count in features[part]:
+                column = indexes.get(term)
+                row = positions.get(movie_id)
+                if column is not None and row is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    counts.append(count)
+
+            matrix = sparse.csr_matrix(
+                (np.array(counts, dtype=np.float32), (rows, columns)),
+                shape=(len(movie_ids), len(indexes)))
+            matrix.sum_duplicates()
+            matrix.data = 1 + np.log(matrix.data)
+            matrix = matrix @ sparse.diags(self.idfs[part])
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1
+            parts.append(sparse.diags(np.sqrt(weight) / norms) @ matrix)
+        return sparse.hstack(parts, format='csr').astype(np.float32)
+
+    def append(self, movie_ids, vectors):
+        """Return model with vectors of movies added to vectors of this one."""
+        return type(self)(
+            np.concatenate([self.movie_ids, movie_ids]),
+            self.vocabularies,
+            self.idfs,
+            sparse.vstack([self.vectors, vectors], format='csr'),
+            self.top_k
+        )
+
+    def save(self, path):
+        """Save model, replacing the previous file only when fully written."""
+        data = {
+            'movie_ids': self.movie_ids,
+            'top_k': np.array(self.top_k),
+            'vectors_data': self.vectors.data,
+            'vectors_indices': self.vectors.indices,
+            'vectors_indptr': self.vectors.indptr,
+            'vectors_shape': np.array(self.vectors.shape),
+        }
+        for part in WEIGHTS:
+            data[f'{part}_terms'] = self.vocabularies[part]
+            data[f'{part}_idf'] = self.idfs[part]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'wb') as f:
+            np.savez(f, **data)
+        os.replace(f'{path}.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            vectors = sparse.csr_matrix(
+                (data['vectors_data'], data['vectors_indices'], data['vectors_indptr']),
+                shape=tuple(data['vectors_shape']))
+            return cls(
+                data['movie_ids'],
+                {part: data[f'{part}_terms'] for part in WEIGHTS},
+                {part: data[f'{part}_idf'] for part in WEIGHTS},
+                vectors,
+                int(data['top_k'])
+            )
+
+
+_loaded = dict()
+_updates = ThreadPoolExecutor(1, thread_name_prefix='content')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def get_model():
+    """Return saved model, loaded again when the file changes, None if not built."""
+    path = model_path()
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _loaded.get('modified') != modified:
+        _loaded['model'] = ContentModel.load(path)
+        _loaded['modified'] = modified
+    return _loaded['model']
+
+
+def schedule_add_movies(movie_ids):
+    """
+    Add movies to the model in the background thread of this process once
+    the current transaction commits, outside of the request. Movies
+    scheduled while an update runs are added together by the next one.
+    """
+    transaction.on_commit(partial(_schedule, list(movie_ids)))
+
+
+def _schedule(movie_ids):
+    with _pending_lock:
+        _pending.update(movie_ids)
+    _updates.submit(add_pending)
+
+
+def add_pending():
+    """Add scheduled movies, returning the connection of the thread to the pool."""
+    with _pending_lock:
+        movie_ids = list(_pending)
+        _pending.clear()
+    if not movie_ids:
+        return
+    try:
+        add_movies(movie_ids)
+    except Exception:
+        logger.exception('Adding %d movies to content model failed', len(movie_ids))
+    finally:
+        connection.close()
+
+
+def add_movies(movie_ids, block_memory=BLOCK_MEMORY):
+    """
+    Store content neighbours of movies missing in the model, add them to
+    neighbours of their neighbours where they rank in top k and append
+    their vectors to the saved model. Only these movies are vectorized and
+    their similarities are computed `block_memory` bytes at a time. The
+    model file is locked, so processes add movies one after another.
+    Does nothing until the model is built.
+    """
+    if not movie_ids or get_model() is None:
+        return
+    with open(f'{model_path()}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # other process could have added movies in the meantime
+        model = get_model()
+        known = set(model.movie_ids.tolist())
+        new_ids = load_movie_ids(
+            movie_id for movie_id in set(movie_ids) if movie_id not in known)
+        if not len(new_ids):
+            return
+        vectors = model.vectorize(new_ids, load_features(new_ids))
+
+        # new movies come first, so top_products skips similarity of movie with itself
+        candidate_ids = np.concatenate([new_ids, model.movie_ids])
+        candidates = sparse.vstack([vectors, model.vectors]).T.tocsc()
+        block_size = max(1, block_memory // (4 * len(candidate_ids)))
+        links = dict()
+        for sources, neighbours, scores in top_products(
+                vectors, candidates, model.top_k, block_size):
+            for movie_id, neighbour_id, score in zip(
+                    new_ids[sources].tolist(), candidate_ids[neighbours].tolist(),
+                    scores.tolist()):
+                links[(movie_id, neighbour_id)] = score
+                links.setdefault((neighbour_id, movie_id), score)
+
+        # movies deleted since the model was built are skipped
+        existing = set(load_movie_ids({movie_id for movie_id, _ in links}).tolist())
+        links = {
+            (movie_id, neighbour_id): score for (movie_id, neighbour_id), score in links.items()
+            if movie_id in existing and neighbour_id in existing
+        }
+        with transaction.atomic():
+            MovieNeighbour.objects.filter(
+                kind=MovieNeighbour.CONTENT, movie_id__in=new_ids.tolist()).delete()
+            MovieNeighbour.objects.filter(
+                kind=MovieNeighbour.CONTENT, neighbour_id__in=new_ids.tolist()).delete()
+            MovieNeighbour.objects.bulk_create([
+                MovieNeighbour(
+                    movie_id=movie_id, neighbour_id=neighbour_id,
+                    kind=MovieNeighbour.CONTENT, score=score)
+                for (movie_id, neighbour_id), score in links.items()
+            ], batch_size=10000)
+            with connection.cursor() as cursor:
+                cursor.execute(TRIM_NEIGHBOURS, {
+                    'kind': MovieNeighbour.CONTENT,
+                    'ids': list({movie_id for movie_id, _ in links}),
+                    'top_k': model.top_k,
+                })
+        model.append(new_ids, vectors).save(model_path())
@@ -0,0 +1,54 @@
+"""
+Django command to build content similarity of movies from their descriptions
+"""
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from core.content import ContentModel, model_path
+from core.management.commands.build_similar_movies import peak_memory
+from core.models import MovieNeighbour
+from core.similarity import save_neighbours, top_products
+
+
+class Command(BaseCommand):
+    """Django command to build TF-IDF vectors and top k similar movies of every movie"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument(
+            '--block-memory', type=int, default=256,
+            help='MB of memory used for one block of similarities.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        start = time.perf_counter()
+        model = ContentModel.build(options['top_k'])
+        sizes = ', '.join(
+            f'{len(terms)} {part} terms' for part, terms in model.vocabularies.items())
+        self.stdout.write(
+            f'Vectorized {len(model.movie_ids)} movies ({sizes}) '
+            f'in {time.perf_counter() - start:.1f}s (peak memory {peak_memory():.0f} MB)')
+
+        step = time.perf_counter()
+        block_size = max(1, options['block_memory'] * 2**20 // (
+            4 * max(len(model.movie_ids), 1)))
+        blocks = list(top_products(
+            model.vectors, model.columns, options['top_k'], block_size))
+        if blocks:
+            sources, neighbours, scores = (np.concatenate(arrays) for arrays in zip(*blocks))
+        else:
+            sources = neighbours = np.array([], dtype=np.int64)
+            scores = np.array([], dtype=np.float32)
+        saved = save_neighbours(
+            MovieNeighbour.CONTENT,
+            model.movie_ids[sources], model.movie_ids[neighbours], scores)
+        model.save(model_path())
+        self.stdout.write(
+            f'Saved {saved} neighbours in {time.perf_counter() - step:.1f}s '
+            f'(peak memory {peak_memory():.0f} MB)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built content model in {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,71 @@
+"""
+Django command to build similar movies from co-ratings of users
+"""
+import resource
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from core.models import MovieNeighbour
+from core.similarity import (
+    ADJUSTED_COSINE, COSINE, load_rating_matrix, save_neighbours, top_neighbours
+)
+
+
+def peak_memory():
+    """Return peak resident memory of process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    """Django command to compute top k similar movies of every movie"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--metric', choices=[ADJUSTED_COSINE, COSINE], default=ADJUSTED_COSINE)
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument(
+            '--shrinkage', type=float, default=10,
+            help='Shrink similarity of movies rated together by few users.')
+        parser.add_argument(
+            '--block-memory', type=int, default=256,
+            help='MB of memory used for one block of similarities.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        start = time.perf_counter()
+        matrix, user_ids, movie_ids = load_rating_matrix()
+        size = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+        self.stdout.write(
+            f'Loaded {matrix.nnz} ratings of {len(user_ids)} users and '
+            f'{len(movie_ids)} movies in {time.perf_counter() - start:.1f}s '
+            f'(matrix {size:.1f} MB, peak memory {peak_memory():.0f} MB)')
+
+        # one block holds dense scores, and co-rating counts with shrinkage
+        factor = 2 if options['shrinkage'] else 1
+        block_size = max(1, options['block_memory'] * 2**20 // (
+            4 * factor * max(len(movie_ids), 1)))
+
+        step = time.perf_counter()
+        blocks = list(top_neighbours(
+            matrix, options['top_k'], options['metric'],
+            options['shrinkage'], block_size))
+        if blocks:
+            sources, neighbours, scores = (np.concatenate(arrays) for arrays in zip(*blocks))
+        else:
+            sources = neighbours = np.array([], dtype=np.int64)
+            scores = np.array([], dtype=np.float32)
+        self.stdout.write(
+            f'Computed {len(scores)} neighbours in blocks of {block_size} movies '
+            f'in {time.perf_counter() - step:.1f}s (peak memory {peak_memory():.0f} MB)')
+
+        step = time.perf_counter()
+        saved = save_neighbours(
+            MovieNeighbour.RATINGS, movie_ids[sources], movie_ids[neighbours], scores)
+        self.stdout.write(f'Saved {saved} neighbours in {time.perf_counter() - step:.1f}s')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built similar movies in {time.perf_counter() - start:.1f}s, '
+            f'peak memory {peak_memory():.0f} MB'))
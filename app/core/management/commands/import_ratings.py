@@ -0,0 +1,178 @@
+"""
+Django command to import ratings from csv or ndjson file
+"""
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.cache import bump_generation
+from core.models import ImportCheckpoint, MAX_RATING, MIN_RATING, Movie, Rating
+from core.ratings import recompute_rating_totals
+
+
+# accepted names of columns, MovieLens names included
+COLUMNS = {
+    'movie_id': ['movie_id', 'movieId'],
+    'user_id': ['user_id', 'userId'],
+    'rating': ['rating'],
+    'comment': ['comment'],
+}
+
+
+def read_rows(path, file_format):
+    """
+    Yield rows of file, dicts of csv files and lines of ndjson files,
+    which are decoded by Command.parse with other checks of rows.
+    """
+    with open(path, 'r', newline='') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def column(row, name):
+    """Return value of column from row under any of its accepted names."""
+    for key in COLUMNS[name]:
+        value = row.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+class Command(BaseCommand):
+    """
+    Django command to import ratings in batches.
+    Ratings are written without updating movie totals, which are rebuilt
+    for all affected movies with one grouped update at the end. Position
+    in file is committed with every batch, so an interrupted import
+    continues from the last committed batch when run again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Csv or ndjson file with ratings.')
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help='Format of file, guessed from its extension if not given.')
+        parser.add_argument(
+            '--method', choices=['copy', 'insert'], default='copy',
+            help='Write batches with COPY (default) or multi-row INSERT.')
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument(
+            '--rating-scale', type=float, default=1,
+            help='Multiply ratings, e.g. 2 for MovieLens 0.5-5 stars.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore position of previous import of the file.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'File {path} does not exist')
+        file_format = options['format'] or (
+            'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        self.scale = options['rating_scale']
+        self.movie_ids = set(Movie.objects.values_list('id', flat=True).iterator())
+        self.user_ids = set(get_user_model().objects.values_list('id', flat=True).iterator())
+        write = self.copy_ratings if options['method'] == 'copy' else self.insert_ratings
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=os.path.abspath(path))
+        if options['restart']:
+            checkpoint.position = 0
+            checkpoint.save()
+
+        rows = read_rows(path, file_format)
+        affected = set()
+        if checkpoint.position:
+            # movies of ratings imported before interruption need totals too
+            for row in islice(rows, checkpoint.position):
+                rating = self.parse(row)
+                if rating is not None:
+                    affected.add(rating[0])
+            self.stdout.write(f'Resuming after {checkpoint.position} rows...')
+
+        imported = skipped = 0
+        start = time.perf_counter()
+        while True:
+            chunk = list(islice(rows, options['batch_size']))
+            if not chunk:
+                break
+            ratings = [rating for rating in map(self.parse, chunk) if rating is not None]
+            with transaction.atomic():
+                write(ratings)
+                checkpoint.position += len(chunk)
+                checkpoint.save()
+            affected.update(rating[0] for rating in ratings)
+            imported += len(ratings)
+            skipped += len(chunk) - len(ratings)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{imported} ratings imported ({imported / elapsed:.0f} rows/sec)')
+
+        self.stdout.write(f'Rebuilding rating statistics of {len(affected)} movies...')
+        recompute_rating_totals(affected)
+        bump_generation()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} ratings in {elapsed:.1f}s, skipped {skipped} invalid rows'))
+
+    def parse(self, row):
+        """
+        Return (movie id, user id, rating, comment) from row,
+        None if the row is invalid or refers to missing movie or user.
+        Lines of ndjson files which are not JSON objects are invalid rows.
+        """
+        if isinstance(row, str):
+            try:
+                row = json.loads(row)
+            except ValueError:
+                return None
+        if not isinstance(row, dict):
+            return None
+        try:
+            movie_id = int(column(row, 'movie_id'))
+            rating = round(float(column(row, 'rating')) * self.scale)
+            user_id = column(row, 'user_id')
+            user_id = int(user_id) if user_id is not None else None
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if movie_id not in self.movie_ids or not MIN_RATING <= rating <= MAX_RATING:
+            return None
+        if user_id is not None and user_id not in self.user_ids:
+            return None
+        comment = column(row, 'comment')
+        return movie_id, user_id, rating, str(comment)[:255] if comment else None
+
+    def copy_ratings(self, ratings):
+        """Write ratings with COPY."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        now = timezone.now().isoformat()
+        for movie_id, user_id, rating, comment in ratings:
+            writer.writerow([movie_id, user_id, rating, comment, now])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {Rating._meta.db_table} '
+                '(movie_id_id, user_id, rating, comment, modified) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    def insert_ratings(self, ratings):
+        """Write ratings with multi-row INSERT."""
+        Rating.objects.bulk_create([
+            Rating(movie_id_id=movie_id, user_id=user_id, rating=rating, comment=comment)
+            for movie_id, user_id, rating, comment in ratings
+        ], batch_size=5000)
@@ -0,0 +1,32 @@
+"""
+Django command to rebuild rating statistics of movies from their ratings
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_generation, bump_movies
+from core.ratings import recompute_rating_totals
+
+
+class Command(BaseCommand):
+    """Django command to rebuild rating sum, count, average and histogram"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'movie_ids', nargs='*', type=int,
+            help='Ids of movies to rebuild, all movies if not given.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Rebuilding rating statistics...')
+        start = time.perf_counter()
+        movie_ids = options['movie_ids'] or None
+        updated = recompute_rating_totals(movie_ids)
+        if movie_ids:
+            bump_movies(movie_ids)
+        else:
+            bump_generation()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating statistics of {updated} movies in {elapsed:.1f}s'))
@@ -0,0 +1,27 @@
+"""
+Django command to refresh top charts of movies
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.charts import refresh_charts
+
+
+class Command(BaseCommand):
+    """Django command to rank movies in overall, genre and decade charts"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-votes', type=int,
+            help='Weight of mean rating in number of ratings, '
+                 'median number of ratings of rated movies if not given.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Refreshing charts...')
+        start = time.perf_counter()
+        charts, entries = refresh_charts(options['min_votes'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {charts} charts with {entries} entries in {elapsed:.1f}s'))
@@ -0,0 +1,52 @@
+"""
+Django command to train factors of personalized recommendations
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.management.commands.build_similar_movies import peak_memory
+from core.recommendations import save_factors, train_als, train_svd
+from core.similarity import load_rating_matrix
+
+
+class Command(BaseCommand):
+    """Django command to factorize user x movie rating matrix"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=['als', 'svd'], default='als')
+        parser.add_argument('--factors', type=int, default=32)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--regularization', type=float, default=0.05)
+        parser.add_argument(
+            '--block-memory', type=int, default=256,
+            help='MB of memory used for normal equations solved at once by ALS.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        start = time.perf_counter()
+        matrix, user_ids, movie_ids = load_rating_matrix()
+        self.stdout.write(
+            f'Loaded {matrix.nnz} ratings of {len(user_ids)} users and '
+            f'{len(movie_ids)} movies in {time.perf_counter() - start:.1f}s')
+
+        step = time.perf_counter()
+        factors = options['factors']
+        if options['method'] == 'als':
+            # factors of rated columns and gram matrices of rows of a block
+            block_ratings = max(1, options['block_memory'] * 2**20 // (4 * factors * (factors + 1)))
+            user_factors, movie_factors, mean = train_als(
+                matrix, factors, options['iterations'], options['regularization'],
+                block_ratings, report=self.report)
+        else:
+            user_factors, movie_factors, mean = train_svd(matrix, factors)
+        self.stdout.write(
+            f'Trained {factors} factors in {time.perf_counter() - step:.1f}s '
+            f'(peak memory {peak_memory():.0f} MB)')
+
+        path = save_factors(user_ids, user_factors, movie_ids, movie_factors, mean)
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved factors to {path} in {time.perf_counter() - start:.1f}s'))
+
+    def report(self, iteration, rmse):
+        self.stdout.write(f'Iteration {iteration}: training RMSE {rmse:.4f}')
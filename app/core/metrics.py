@@ -0,0 +1,305 @@
+"""
+Performance metrics of API endpoints in Prometheus text format.
+
+MetricsMiddleware records for every view and method the latency histogram,
+the number and time of SQL queries (execute wrapper added to every new
+database connection), the time of building response data by serializers
+(DRF serializers with TimedSerializerMixin and fast serializers), the
+time of rendering it by the JSON renderer and the response size. Queries
+run concurrently in other threads are counted too, as the metrics of the
+request live in a context variable.
+
+Every process aggregates its metrics in memory. When METRICS_DIR is set,
+processes also write them to files in that directory (at most every
+FLUSH_INTERVAL seconds), so the metrics endpoint of any worker of a
+multi-process server returns the sum over all workers. The directory is
+cleared when gunicorn starts, files of exited workers are kept so the
+counters never decrease.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+FLUSH_INTERVAL = 5
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+COUNTERS = [
+    'requests', 'duration', 'queries', 'query_duration', 'serialize_duration',
+    'render_duration', 'response_bytes',
+]
+
+# name, type, help, counter of series
+METRICS = [
+    ('http_request_duration_seconds', 'histogram',
+     'Time of handling requests by view and method.', 'duration'),
+    ('http_request_db_queries_total', 'counter',
+     'Number of SQL queries of requests.', 'queries'),
+    ('http_request_db_query_seconds_total', 'counter',
+     'Time of SQL queries of requests.', 'query_duration'),
+    ('http_request_serialize_seconds_total', 'counter',
+     'Time of building response data by serializers.', 'serialize_duration'),
+    ('http_request_render_seconds_total', 'counter',
+     'Time of rendering response data to bytes.', 'render_duration'),
+    ('http_response_bytes_total', 'counter',
+     'Size of response bodies.', 'response_bytes'),
+]
+
+_current = ContextVar('request_metrics', default=None)
+# set in thread building data of outermost serializer, nested ones are not timed again
+_serializing = threading.local()
+
+
+class RequestMetrics:
+    """Measurements of one request, appended to from any thread."""
+
+    def __init__(self):
+        self.queries = []
+        self.serialize_duration = 0.0
+        self.render_duration = 0.0
+
+
+class Registry:
+    """Metrics of this process by (view, method) and request counts by status."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = dict()
+        self.statuses = dict()
+
+    def record(self, view, method, status, duration, metrics, size):
+        key = (view, method)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                    **dict.fromkeys(COUNTERS, 0),
+                }
+            series['buckets'][bisect_left(LATENCY_BUCKETS, duration)] += 1
+            series['requests'] += 1
+            series['duration'] += duration
+            series['queries'] += len(metrics.queries)
+            series['query_duration'] += sum(metrics.queries)
+            series['serialize_duration'] += metrics.serialize_duration
+            series['render_duration'] += metrics.render_duration
+            series['response_bytes'] += size
+            status_key = (view, method, str(status))
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def dump(self):
+        """Return metrics as data which can be saved to JSON."""
+        with self.lock:
+            return {
+                'series': [
+                    [*key, {**series, 'buckets': list(series['buckets'])}]
+                    for key, series in self.series.items()
+                ],
+                'statuses': [[*key, count] for key, count in self.statuses.items()],
+            }
+
+
+_registry = Registry()
+_state = {'flushed': 0}
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper adding duration of query to metrics of current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries.append(time.perf_counter() - start)
+
+
+def add_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(add_query_wrapper)
+
+
+@contextmanager
+def serialize_timer():
+    """
+    Add time spent in the block to serialization time of current request.
+    Blocks nested in a timed block are counted only once.
+    """
+    metrics = _current.get()
+    if metrics is None or getattr(_serializing, 'active', False):
+        yield
+        return
+    _serializing.active = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _serializing.active = False
+        metrics.serialize_duration += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Serializer mixin adding time of building representations to metrics of the request."""
+
+    def to_representation(self, instance):
+        if getattr(_serializing, 'active', False):
+            return super().to_representation(instance)
+        with serialize_timer():
+            return super().to_representation(instance)
+
+
+@contextmanager
+def render_timer():
+    """Add time spent in the block to render time of current request."""
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.render_duration += time.perf_counter() - start
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Record performance metrics of every request. The middleware is async
+    capable, so under ASGI requests are not funneled through the one thread
+    of sync middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as coroutine function, like Django MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, metrics, duration):
+        size = len(response.content) if not response.streaming else 0
+        method = request.method if request.method in METHODS else 'other'
+        _registry.record(
+            view_name(request), method, response.status_code, duration, metrics, size)
+        if settings.METRICS_DIR and time.monotonic() - _state['flushed'] > FLUSH_INTERVAL:
+            flush()
+
+
+def flush():
+    """Save metrics of this process to its file in METRICS_DIR."""
+    _state['flushed'] = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(_registry.dump(), f)
+    os.replace(f'{path}.tmp', path)
+
+
+def collect():
+    """
+    Return metrics of this process or summed over files of all processes
+    in METRICS_DIR. This process saves its file first, so sums read by
+    different workers never decrease.
+    """
+    dumps = [_registry.dump()]
+    if settings.METRICS_DIR:
+        flush()
+        dumps = []
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    series, statuses = dict(), dict()
+    for dump in dumps:
+        for view, method, values in dump['series']:
+            total = series.setdefault((view, method), {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                **dict.fromkeys(COUNTERS, 0),
+            })
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], values['buckets'])]
+            for counter in COUNTERS:
+                # files of workers of older versions may lack new counters
+                total[counter] += values.get(counter, 0)
+        for view, method, status, count in dump['statuses']:
+            statuses[(view, method, status)] = statuses.get((view, method, status), 0) + count
+    return series, statuses
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """Return metrics in Prometheus text exposition format."""
+    series, statuses = collect()
+    lines = [
+        '# HELP http_requests_total Number of requests by view, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (view, method, status), count in sorted(statuses.items()):
+        lines.append(
+            f'http_requests_total{{view="{escape(view)}",method="{method}",'
+            f'status="{status}"}} {count}')
+
+    for name, kind, help_text, counter in METRICS:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for (view, method), values in sorted(series.items()):
+            labels = f'view="{escape(view)}",method="{method}"'
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ['+Inf'], values['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {values["duration"]!r}')
+                lines.append(f'{name}_count{{{labels}}} {values["requests"]}')
+            else:
+                lines.append(f'{name}{{{labels}}} {values[counter]!r}')
+    return '\n'.join(lines) + '\n'
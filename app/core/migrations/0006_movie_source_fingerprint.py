@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_movie_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='source_key',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:45
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_movie_source_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.functions.comparison.Coalesce('average_rating', Decimal('0')), descending=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('id'), descending=True), name='movie_rating_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'id'], name='movie_title_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:47
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_movie_keyset_indexes'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='artist_first_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='artist_last_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='movie_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='movie_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_movie AS m SET search_vector =
+                    setweight(to_tsvector('english', m.title), 'A') ||
+                    setweight(to_tsvector('english', coalesce((
+                        SELECT string_agg(a.first_name || ' ' || a.last_name, ' ')
+                        FROM core_artist AS a
+                        WHERE a.id IN (
+                            SELECT artist_id FROM core_movie_director
+                            WHERE movie_id = m.id
+                            UNION
+                            SELECT artist_id FROM core_movie_actors
+                            WHERE movie_id = m.id
+                        )
+                    ), '')), 'B') ||
+                    setweight(to_tsvector('english', coalesce(m.overview, '')), 'C')
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
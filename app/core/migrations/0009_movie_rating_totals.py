@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_movie_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_movie AS m SET
+                    rating_sum = r.rating_sum,
+                    rating_count = r.rating_count,
+                    average_rating = round(r.rating_sum::numeric / r.rating_count, 2)
+                FROM (
+                    SELECT movie_id_id, sum(rating) AS rating_sum, count(*) AS rating_count
+                    FROM core_rating
+                    GROUP BY movie_id_id
+                ) AS r
+                WHERE m.id = r.movie_id_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_movie_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
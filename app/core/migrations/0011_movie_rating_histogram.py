@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:57
+
+import core.models
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_histogram',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=core.models.empty_histogram, size=None),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_movie AS m SET rating_histogram = r.histogram
+                FROM (
+                    SELECT movie_id_id, ARRAY[
+                        count(*) FILTER (WHERE rating = 1),
+                        count(*) FILTER (WHERE rating = 2),
+                        count(*) FILTER (WHERE rating = 3),
+                        count(*) FILTER (WHERE rating = 4),
+                        count(*) FILTER (WHERE rating = 5),
+                        count(*) FILTER (WHERE rating = 6),
+                        count(*) FILTER (WHERE rating = 7),
+                        count(*) FILTER (WHERE rating = 8),
+                        count(*) FILTER (WHERE rating = 9),
+                        count(*) FILTER (WHERE rating = 10)
+                    ] AS histogram
+                    FROM core_rating
+                    GROUP BY movie_id_id
+                ) AS r
+                WHERE m.id = r.movie_id_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_movie_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['movie_id', '-id'], name='rating_movie_newest_idx'),
+        ),
+    ]
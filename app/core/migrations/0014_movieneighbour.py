@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ratings', 'Rated similarly by users')], max_length=10)),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='core.movie')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='core.movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='movieneighbour',
+            index=models.Index(fields=['movie', 'kind', '-score'], name='neighbour_lookup_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_movieneighbour'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movieneighbour',
+            name='kind',
+            field=models.CharField(choices=[('ratings', 'Rated similarly by users'), ('content', 'Similar overview, genres and cast')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_movieneighbour_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=45, unique=True)),
+                ('kind', models.CharField(choices=[('overall', 'Overall'), ('genre', 'Genre'), ('decade', 'Decade')], max_length=10)),
+                ('decade', models.IntegerField(blank=True, null=True)),
+                ('mean', models.FloatField(default=0)),
+                ('min_votes', models.IntegerField(default=0)),
+                ('refreshed', models.DateTimeField(auto_now=True)),
+                ('genre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.genre')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChartEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('chart', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.chart')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_entries', to='core.movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chartentry',
+            index=models.Index(fields=['chart', '-score', '-id'], name='chart_ranking_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='chartentry',
+            constraint=models.UniqueConstraint(fields=('chart', 'movie'), name='unique_chart_movie'),
+        ),
+    ]
@@ -1,9 +1,19 @@
 """
 Database models.
 """
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -11,6 +21,8 @@ from django.contrib.auth.models import (
 )
 from django.core.validators import MaxValueValidator, MinValueValidator
 
+from core.cache import bump_movies
+
 
 class UserManager(BaseUserManager):
     """Manager for users."""
@@ -46,6 +58,25 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def save(self, *args, **kwargs):
+        """
+        Save user. When the name changes, mark their ratings modified and
+        invalidate cached responses of rated movies, which show the name.
+        """
+        update_fields = kwargs.get('update_fields')
+        renamed = (
+            not self._state.adding
+            and (update_fields is None or 'name' in update_fields)
+            and User.objects.filter(pk=self.pk).exclude(name=self.name).exists()
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if renamed:
+                # ratings are listed with names of their users
+                ratings = Rating.objects.filter(user_id=self.pk)
+                ratings.update(modified=timezone.now())
+                bump_movies(ratings.values('movie_id'))
+
 
 class Artist(models.Model):
     """Artist object. (Artist can be either actor or director or both.)"""
@@ -53,10 +84,68 @@ class Artist(models.Model):
     last_name = models.CharField(max_length=45)
     slug = models.SlugField(null=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['first_name'], name='artist_first_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['last_name'], name='artist_last_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
 
+MIN_RATING = 1
+MAX_RATING = 10
+
+
+def empty_histogram():
+    """Return histogram of movie without ratings."""
+    return [0] * (MAX_RATING - MIN_RATING + 1)
+
+
+class MovieManager(models.Manager):
+    """Manager for movies."""
+
+    def add_ratings(self, movie_id, added=(), removed=()):
+        """
+        Add rating values to sum, count and histogram of the movie and
+        remove others, deriving its average in the same single UPDATE,
+        so concurrent ratings are never lost. Removed values must be read
+        under a row lock of their ratings (see Rating.stored_rating and
+        RatingQuerySet.delete), so count and histogram never disagree.
+        """
+        deltas = empty_histogram()
+        for values, delta in [(added, 1), (removed, -1)]:
+            for value in values:
+                if MIN_RATING <= value <= MAX_RATING:
+                    deltas[value - MIN_RATING] += delta
+        histogram = ', '.join(
+            f'rating_histogram[{index}] + %s' for index in range(1, len(deltas) + 1))
+
+        new_sum = F('rating_sum') + (sum(added) - sum(removed))
+        new_count = F('rating_count') + (len(added) - len(removed))
+        updated = self.filter(id=movie_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_histogram=RawSQL(f'ARRAY[{histogram}]', deltas),
+            average_rating=Cast(
+                Cast(new_sum, models.DecimalField(max_digits=12, decimal_places=2))
+                / NullIf(new_count, 0),
+                models.DecimalField(max_digits=5, decimal_places=2)
+            ),
+            updated=date.today(),
+            modified=timezone.now()
+        )
+        ChartEntry.objects.update_movies([movie_id])
+        return updated
+
+
+# movies without ratings are listed after rated ones
+RATING_ORDERING = Coalesce('average_rating', Decimal(0))
+
+
 class Movie(models.Model):
     """The movie object."""
     title = models.CharField(max_length=100)
@@ -67,21 +156,109 @@ class Movie(models.Model):
     overview = models.TextField(blank=True, null=True)
     created = models.DateField(auto_now_add=True)
     updated = models.DateField(auto_now=True)
+    # precise time of last change of movie or its ratings, for HTTP validators
+    modified = models.DateTimeField(auto_now=True, db_index=True)
     average_rating = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    # number of ratings of each value from MIN_RATING to MAX_RATING
+    rating_histogram = ArrayField(models.IntegerField(), default=empty_histogram)
     slug = models.SlugField(null=True)
+    source_key = models.CharField(max_length=40, blank=True, null=True, db_index=True)
+    source_hash = models.CharField(max_length=40, blank=True, null=True)
+    # title, artist names and overview, filled by core.search
+    search_vector = SearchVectorField(null=True)
+
+    objects = MovieManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='movie_search_vector_idx'),
+            GinIndex(fields=['title'], name='movie_title_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            models.Index(
+                RATING_ORDERING.desc(), F('id').desc(), name='movie_rating_keyset_idx'),
+            models.Index(fields=['title', 'id'], name='movie_title_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class RatingQuerySet(models.QuerySet):
+    """Queryset of ratings keeping rating totals of movies on deletes."""
+
+    def delete(self):
+        """
+        Delete ratings and remove them from rating totals and histograms of
+        their movies, also for bulk deletes such as the admin delete action.
+        Rows are locked first, so totals subtract the values actually deleted.
+        """
+        with transaction.atomic():
+            removed = defaultdict(list)
+            rating_ids = []
+            for rating_id, movie_id, rating in self.select_for_update().values_list(
+                    'id', 'movie_id', 'rating'):
+                rating_ids.append(rating_id)
+                removed[movie_id].append(rating)
+            result = self.model._base_manager.using(self.db).filter(id__in=rating_ids).delete()
+            for movie_id, ratings in removed.items():
+                Movie.objects.add_ratings(movie_id, removed=ratings)
+            bump_movies(list(removed))
+        return result
+
+
 class Rating(models.Model):
     """Rating object."""
     movie_id = models.ForeignKey('Movie', on_delete=models.CASCADE)
     rating = models.IntegerField(default=3, validators=[
-        MaxValueValidator(10), MinValueValidator(1)
+        MaxValueValidator(MAX_RATING), MinValueValidator(MIN_RATING)
     ])
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
     comment = models.CharField(max_length=255, blank=True, null=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = RatingQuerySet.as_manager()
+
+    def stored_rating(self):
+        """
+        Return (movie id, rating) stored in database, None for new rating.
+        The row is locked until the transaction ends, so concurrent saves of
+        the rating apply their differences one after another.
+        """
+        if self._state.adding:
+            return None
+        return Rating.objects.select_for_update().filter(pk=self.pk).values_list(
+            'movie_id', 'rating').first()
+
+    def save(self, *args, **kwargs):
+        """Save rating and update rating totals and cache version of its movie."""
+        with transaction.atomic():
+            stored = self.stored_rating()
+            super().save(*args, **kwargs)
+            changed = {self.movie_id_id}
+            if stored is None:
+                Movie.objects.add_ratings(self.movie_id_id, added=[self.rating])
+            elif stored[0] != self.movie_id_id:
+                Movie.objects.add_ratings(stored[0], removed=[stored[1]])
+                Movie.objects.add_ratings(self.movie_id_id, added=[self.rating])
+                changed.add(stored[0])
+            else:
+                Movie.objects.add_ratings(
+                    self.movie_id_id, added=[self.rating], removed=[stored[1]])
+            bump_movies(changed)
+
+    def delete(self, using=None, keep_parents=False):
+        """Delete rating and update rating totals and cache version of its movie."""
+        result = Rating.objects.using(using).filter(pk=self.pk).delete()
+        self.pk = None
+        return result
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['movie_id', '-id'], name='rating_movie_newest_idx'),
+            models.Index(fields=['movie_id', '-modified'], name='rating_movie_modified_idx'),
+        ]
 
     def __str__(self):
         return f'{self.rating} by {self.user}'
@@ -93,3 +270,129 @@ class Genre(models.Model):
 
     def __str__(self):
         return self.genre
+
+
+class ImportCheckpoint(models.Model):
+    """Number of source rows already imported, used to resume imports."""
+    source = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source}: {self.position}'
+
+
+class MovieNeighbour(models.Model):
+    """Movie similar to another movie with similarity score, computed offline."""
+    RATINGS = 'ratings'
+    CONTENT = 'content'
+    KIND_CHOICES = [
+        (RATINGS, 'Rated similarly by users'),
+        (CONTENT, 'Similar overview, genres and cast'),
+    ]
+
+    movie = models.ForeignKey(
+        'Movie', on_delete=models.CASCADE, related_name='neighbours', db_index=False)
+    neighbour = models.ForeignKey(
+        'Movie', on_delete=models.CASCADE, related_name='neighbour_of')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['movie', 'kind', '-score'], name='neighbour_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.neighbour} similar to {self.movie}'
+
+
+class Chart(models.Model):
+    """
+    Ranking of movies by Bayesian average of their ratings: overall,
+    of a genre or of a decade. Average rating of a movie is pulled towards
+    `mean` as if it had `min_votes` more ratings equal to the mean.
+    """
+    OVERALL = 'overall'
+    GENRE = 'genre'
+    DECADE = 'decade'
+    KIND_CHOICES = [
+        (OVERALL, 'Overall'),
+        (GENRE, 'Genre'),
+        (DECADE, 'Decade'),
+    ]
+
+    key = models.CharField(max_length=45, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    genre = models.ForeignKey('Genre', on_delete=models.CASCADE, blank=True, null=True)
+    decade = models.IntegerField(blank=True, null=True)
+    mean = models.FloatField(default=0)
+    min_votes = models.IntegerField(default=0)
+    refreshed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
+class ChartEntryManager(models.Manager):
+    """Manager for entries of charts."""
+
+    def update_movies(self, movie_ids=None):
+        """
+        Replace entries of given movies, or of all movies if not given,
+        in every chart they belong to. Movies without ratings are not ranked.
+        Charts keep their mean and minimum votes, which change only when
+        all charts are refreshed.
+        """
+        entries = self.model._meta.db_table
+        movies = Movie._meta.db_table
+        movie_filter = 'AND m.id = ANY(%(ids)s)' if movie_ids is not None else ''
+        delete_sql = f'DELETE FROM {entries}'
+        if movie_ids is not None:
+            delete_sql += ' WHERE movie_id = ANY(%(ids)s)'
+        insert_sql = f"""
+            INSERT INTO {entries} (chart_id, movie_id, score)
+            SELECT c.id, m.id,
+                (m.rating_sum + c.min_votes * c.mean) / (m.rating_count + c.min_votes)
+            FROM {movies} AS m
+            JOIN {Chart._meta.db_table} AS c ON (
+                c.kind = %(overall)s
+                OR (c.kind = %(decade)s AND m.year > 0 AND c.decade = m.year / 10 * 10)
+                OR (c.kind = %(genre)s AND c.genre_id IN (
+                    SELECT genre_id FROM {Movie.genre.through._meta.db_table}
+                    WHERE movie_id = m.id
+                ))
+            )
+            WHERE m.rating_count > 0 {movie_filter}
+            ON CONFLICT (chart_id, movie_id) DO UPDATE SET score = EXCLUDED.score
+        """
+        params = {
+            'ids': list(movie_ids or []),
+            'overall': Chart.OVERALL,
+            'decade': Chart.DECADE,
+            'genre': Chart.GENRE,
+        }
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(delete_sql, params)
+            cursor.execute(insert_sql, params)
+
+
+class ChartEntry(models.Model):
+    """Movie in chart with its Bayesian average score."""
+    chart = models.ForeignKey(
+        'Chart', on_delete=models.CASCADE, related_name='entries', db_index=False)
+    movie = models.ForeignKey('Movie', on_delete=models.CASCADE, related_name='chart_entries')
+    score = models.FloatField()
+
+    objects = ChartEntryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chart', 'movie'], name='unique_chart_movie'),
+        ]
+        indexes = [
+            models.Index(fields=['chart', '-score', '-id'], name='chart_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.movie} in {self.chart}'
@@ -0,0 +1,239 @@
+"""
+Postgres database backend with a bounded pool of connections per process.
+
+Django opens a connection for every request and closes it at its end
+(CONN_MAX_AGE = 0). With this backend closing returns the connection to
+the pool of the process, so requests reuse open connections, while the
+number of connections of a process never exceeds POOL['MAX_SIZE'].
+Threads wait for a free connection at most POOL['TIMEOUT'] seconds.
+
+Connections idle longer than POOL['CHECK_AFTER'] seconds are checked with
+a query before reuse and connections older than POOL['MAX_LIFETIME']
+seconds are replaced, so restarts of Postgres or PgBouncer and server-side
+timeouts are handled without errors in requests.
+
+Connections of threads which ended without returning them are reclaimed
+when the pool is full, so they cannot take its slots forever.
+
+Pools are kept per connection parameters (NAME, HOST, PORT, USER and
+OPTIONS). When parameters of a database alias change, e.g. when tests
+create their database, idle connections of the previous pool are closed
+and connections still in use are closed when returned, so a connection
+to another database is never reused or left open.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError, extensions
+
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 30 * 60,
+    'CHECK_AFTER': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    """No connection of the pool became free in time."""
+
+
+class ConnectionPool:
+    """Thread safe pool of at most `max_size` psycopg2 connections."""
+
+    def __init__(self, max_size, timeout, max_lifetime, check_after):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.condition = threading.Condition()
+        # (connection, created, returned) of free connections, last returned on the right
+        self.idle = deque()
+        # connection -> (created, thread) of connections in use
+        self.used = dict()
+        self.opening = 0
+        self.waiting = 0
+        self.closed = False
+        self.counters = dict.fromkeys([
+            'acquired', 'created', 'recycled', 'failed_checks', 'discarded', 'reclaimed',
+            'timeouts'], 0)
+        self.wait_time = 0.0
+
+    def acquire(self, connect):
+        """Return free connection, opening a new one with `connect()` if the pool is not full."""
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                while self.idle:
+                    connection, created, returned = self.idle.pop()
+                    if self.usable(connection, created, returned):
+                        self.used[connection] = (created, threading.current_thread())
+                        self.count_acquired(start)
+                        return connection
+                if len(self.used) + self.opening >= self.max_size:
+                    self.reclaim()
+                if len(self.used) + self.opening < self.max_size:
+                    self.opening += 1
+                    break
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection became free in {self.timeout}s '
+                        f'(pool size {self.max_size}).')
+                self.waiting += 1
+                try:
+                    self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+        # connect outside of the lock, other threads can take returned connections
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.opening -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opening -= 1
+            self.used[connection] = (time.monotonic(), threading.current_thread())
+            self.counters['created'] += 1
+            self.count_acquired(start)
+        return connection
+
+    def count_acquired(self, start):
+        self.counters['acquired'] += 1
+        self.wait_time += time.monotonic() - start
+
+    def usable(self, connection, created, returned):
+        """Return True if idle connection can be reused, close it otherwise."""
+        now = time.monotonic()
+        if now - created > self.max_lifetime:
+            self.counters['recycled'] += 1
+            self.discard(connection)
+            return False
+        if now - returned > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                connection.rollback()
+            except Exception:
+                self.counters['failed_checks'] += 1
+                self.discard(connection)
+                return False
+        return True
+
+    def release(self, connection):
+        """Return connection to the pool, closing it when it cannot be reused."""
+        with self.condition:
+            created, _ = self.used.pop(connection, (None, None))
+            if created is None:
+                return
+            status = connection.info.transaction_status if not connection.closed else None
+            if status in (extensions.TRANSACTION_STATUS_INTRANS,
+                          extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    connection.rollback()
+                    status = connection.info.transaction_status
+                except Exception:
+                    status = None
+            if self.closed:
+                self.discard(connection)
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                self.counters['discarded'] += 1
+                self.discard(connection)
+            elif time.monotonic() - created > self.max_lifetime:
+                self.counters['recycled'] += 1
+                self.discard(connection)
+            else:
+                self.idle.append((connection, created, time.monotonic()))
+            self.condition.notify()
+
+    def reclaim(self):
+        """Close connections in use by threads which ended without returning them."""
+        for connection, (_, thread) in list(self.used.items()):
+            if not thread.is_alive():
+                del self.used[connection]
+                self.counters['reclaimed'] += 1
+                self.discard(connection)
+
+    def close(self):
+        """Close idle connections, connections in use are closed when returned."""
+        with self.condition:
+            self.closed = True
+            while self.idle:
+                connection, _, _ = self.idle.pop()
+                self.discard(connection)
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'size': len(self.used) + len(self.idle),
+                'in_use': len(self.used),
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                **self.counters,
+                'average_wait_ms': round(
+                    1000 * self.wait_time / max(self.counters['acquired'], 1), 3),
+            }
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def connection_params(settings_dict):
+    """Return hashable parameters of connections of database settings."""
+    return tuple(repr(settings_dict.get(key)) for key in ['NAME', 'HOST', 'PORT', 'USER', 'OPTIONS'])
+
+
+def get_pool(alias, settings_dict):
+    """
+    Return pool of database alias of this process for current connection
+    parameters, closing pools of its previous parameters. Forked worker
+    processes get new pools, connections of the parent process are never
+    shared.
+    """
+    pid = os.getpid()
+    key = (alias, pid, connection_params(settings_dict))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                for other in [other for other in _pools if other[:2] == (alias, pid)]:
+                    _pools.pop(other).close()
+                options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+                pool = ConnectionPool(
+                    max_size=options['MAX_SIZE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                    check_after=options['CHECK_AFTER'],
+                )
+                _pools[key] = pool
+    return pool
+
+
+def close_pools(alias):
+    """Close pools of database alias of this process, e.g. before dropping its database."""
+    pid = os.getpid()
+    with _pools_lock:
+        for key in [key for key in _pools if key[:2] == (alias, pid)]:
+            _pools.pop(key).close()
+
+
+def stats():
+    """Return dict of database alias -> statistics of its pool in this process."""
+    pid = os.getpid()
+    return {alias: pool.stats() for (alias, pool_pid, _), pool in _pools.items() if pool_pid == pid}
@@ -0,0 +1,45 @@
+"""
+Postgres DatabaseWrapper taking connections from the pool of the process.
+"""
+from django.db.backends.postgresql import base, creation
+
+from core.pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Test database creation closing pooled connections before the database
+    is copied or dropped, which Postgres refuses while others are connected.
+    """
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Postgres backend whose connections are borrowed from and returned to a pool."""
+    creation_class = DatabaseCreation
+
+    def get_pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # returned to the pool it came from, even if settings change in between
+        self.pool = pool
+        # set by parent class only for new connections
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
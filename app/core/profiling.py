@@ -0,0 +1,285 @@
+"""
+On-demand profiling of requests.
+
+A request is profiled when an admin sends it with the `X-Profile` header
+and their token, or at random with probability PROFILING_SAMPLE_RATE.
+Other requests only pay for the sampling check.
+
+Profile of a request holds cProfile statistics of every thread which
+worked on it (views and queries run in thread pools of core.concurrent are
+profiled too) and the SQL queries it issued. Served by ASGI, the event loop
+thread is shared by all requests, so only threads running the view and its
+queries are profiled. It is saved to PROFILE_DIR as
+`<id>.prof`, readable by pstats, snakeviz or flameprof, and `<id>.json`
+with the queries and a text report, served by the admin profiles endpoint.
+Only the newest PROFILE_KEEP profiles are kept.
+"""
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import CachedTokenAuthentication
+from core.metrics import view_name
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+REPORT_FUNCTIONS = 60
+# frames of these paths are skipped in the origin of queries
+LIBRARY_PATHS = ('site-packages', 'lib/python', 'core/profiling.py',
+                 'core/metrics.py', 'core/concurrent.py')
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Profilers of threads working on a request and its SQL queries."""
+
+    def __init__(self, reason):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.reason = reason
+        self.profilers = []
+        self.queries = []
+
+    def start_thread(self):
+        """Return profiler enabled in current thread."""
+        profiler = cProfile.Profile()
+        self.profilers.append(profiler)
+        profiler.enable()
+        return profiler
+
+    def stats(self):
+        stats = None
+        for profiler in self.profilers:
+            if stats is None:
+                stats = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        return stats
+
+
+def query_origin():
+    """Return 'file:line function' of the innermost application frame."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if not any(path in frame.filename for path in LIBRARY_PATHS):
+            return f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno} {frame.name}'
+    return ''
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper saving queries of profiled requests."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append({
+            'sql': sql,
+            'params': repr(params)[:500],
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+            'origin': query_origin(),
+        })
+
+
+def add_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(add_query_wrapper)
+
+
+def profiled(function):
+    """Return function profiled in its thread when called for a profiled request."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return function(*args, **kwargs)
+        profiler = profile.start_thread()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+    return wrapper
+
+
+def is_admin_request(request):
+    """Return True if request is authenticated with token of an admin."""
+    try:
+        user_auth = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return user_auth is not None and user_auth[0].is_staff
+
+
+def is_admin_request_in_thread(request):
+    """is_admin_request for a thread outside of request handling, returning its connection."""
+    try:
+        return is_admin_request(request)
+    finally:
+        connection.close()
+
+
+class ProfilingMiddleware:
+    """Profile requests asked for by admins and a sample of all requests."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as coroutine function, like Django MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if request.META.get(HEADER) and is_admin_request(request):
+            reason = 'header'
+        elif is_sampled():
+            reason = 'sample'
+        else:
+            return self.get_response(request)
+
+        profile = RequestProfile(reason)
+        token = _current.set(profile)
+        start = time.perf_counter()
+        profiler = profile.start_thread()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        if try_save(profile, request, response, duration):
+            response['X-Profile-Id'] = profile.id
+        return response
+
+    async def __acall__(self, request):
+        # authentication may query the database, which is not allowed in the event loop
+        if request.META.get(HEADER) and await sync_to_async(
+                is_admin_request_in_thread, thread_sensitive=False)(request):
+            reason = 'header'
+        elif is_sampled():
+            reason = 'sample'
+        else:
+            return await self.get_response(request)
+
+        profile = RequestProfile(reason)
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        # views not run by the view pool have no profiled thread
+        if profile.profilers and await sync_to_async(try_save, thread_sensitive=False)(
+                profile, request, response, duration):
+            response['X-Profile-Id'] = profile.id
+        return response
+
+
+def is_sampled():
+    return bool(settings.PROFILING_SAMPLE_RATE) and random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def report(stats):
+    """Return text report of functions with the highest cumulative time."""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats('cumulative').print_stats(REPORT_FUNCTIONS)
+    return stream.getvalue()
+
+
+def try_save(profile, request, response, duration):
+    """Save profile, return False if it could not be written, the response is served anyway."""
+    try:
+        save(profile, request, response, duration)
+    except OSError as error:
+        logger.error('Saving profile %s to %s failed: %s', profile.id, settings.PROFILE_DIR, error)
+        return False
+    return True
+
+
+def save(profile, request, response, duration):
+    """Save profile files and remove the oldest ones above PROFILE_KEEP."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, profile.id)
+    stats = profile.stats()
+    stats.dump_stats(f'{path}.prof')
+    data = {
+        'id': profile.id,
+        'reason': profile.reason,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': view_name(request),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'threads': len(profile.profilers),
+        'query_count': len(profile.queries),
+        'query_duration_ms': round(sum(query['duration_ms'] for query in profile.queries), 3),
+        'queries': profile.queries,
+        'report': report(stats),
+    }
+    with open(f'{path}.json.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.json.tmp', f'{path}.json')
+
+    for old in list_profiles()[settings.PROFILE_KEEP:]:
+        for extension in ['json', 'prof']:
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, f"{old}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Return ids of saved profiles, newest first."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    return sorted(
+        (name[:-len('.json')] for name in os.listdir(settings.PROFILE_DIR)
+         if name.endswith('.json')),
+        reverse=True)
+
+
+def profile_path(profile_id, extension):
+    """Return path of file of saved profile, None if there is no such profile."""
+    if profile_id not in list_profiles():
+        return None
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def load_profile(profile_id):
+    """Return data of saved profile, None if there is no such profile."""
+    path = profile_path(profile_id, 'json')
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
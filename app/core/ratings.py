@@ -0,0 +1,77 @@
+"""
+Rating statistics of movies.
+"""
+import math
+
+from django.db import connection
+
+from core.models import MAX_RATING, MIN_RATING, ChartEntry, Movie, Rating
+
+
+HISTOGRAM_COUNTS = ', '.join(
+    f'count(*) FILTER (WHERE rating = {value})'
+    for value in range(MIN_RATING, MAX_RATING + 1)
+)
+
+# totals of movies rebuilt from ratings with a single grouped UPDATE
+RECOMPUTE_TOTALS = f"""
+    UPDATE {Movie._meta.db_table} AS m SET
+        rating_sum = coalesce(r.rating_sum, 0),
+        rating_count = coalesce(r.rating_count, 0),
+        average_rating = round(r.rating_sum::numeric / r.rating_count, 2),
+        rating_histogram = coalesce(r.histogram, %(empty)s),
+        modified = now()
+    FROM {Movie._meta.db_table} AS target
+    LEFT JOIN (
+        SELECT
+            movie_id_id,
+            sum(rating) AS rating_sum,
+            count(*) AS rating_count,
+            ARRAY[{HISTOGRAM_COUNTS}] AS histogram
+        FROM {Rating._meta.db_table}
+        {{ratings_filter}}
+        GROUP BY movie_id_id
+    ) AS r ON r.movie_id_id = target.id
+    WHERE m.id = target.id {{movies_filter}}
+"""
+
+
+def recompute_rating_totals(movie_ids=None):
+    """
+    Rebuild rating sum, count, average and histogram of given movies,
+    or of all movies if not given, from their ratings, and rank them
+    in charts again.
+    """
+    params = {'empty': [0] * (MAX_RATING - MIN_RATING + 1)}
+    filters = {'ratings_filter': '', 'movies_filter': ''}
+    if movie_ids is not None:
+        params['ids'] = list(movie_ids)
+        filters = {
+            'ratings_filter': 'WHERE movie_id_id = ANY(%(ids)s)',
+            'movies_filter': 'AND m.id = ANY(%(ids)s)',
+        }
+    with connection.cursor() as cursor:
+        cursor.execute(RECOMPUTE_TOTALS.format(**filters), params)
+        updated = cursor.rowcount
+    ChartEntry.objects.update_movies(movie_ids)
+    return updated
+
+
+def rating_stats(histogram):
+    """Return count, average, standard deviation and distribution of ratings."""
+    count = sum(histogram)
+    values = range(MIN_RATING, MIN_RATING + len(histogram))
+    stats = {
+        'count': count,
+        'average': None,
+        'std_dev': None,
+        'histogram': {str(value): number for value, number in zip(values, histogram)},
+    }
+    if count:
+        mean = sum(value * number for value, number in zip(values, histogram)) / count
+        variance = sum(
+            number * (value - mean) ** 2 for value, number in zip(values, histogram)
+        ) / count
+        stats['average'] = round(mean, 2)
+        stats['std_dev'] = round(math.sqrt(variance), 2)
+    return stats
@@ -0,0 +1,229 @@
+"""
+Personalized movie recommendations from matrix factorization.
+
+User and movie factors are trained offline from ratings and saved as .npy
+files in a new directory of MODEL_DATA_DIR, which becomes current only
+when fully written. Web workers open the current factors memory-mapped,
+so all of them share the same pages of the OS page cache instead of
+loading their own copies, and a new version is picked up without restart.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from django.conf import settings
+
+from core.models import MAX_RATING, MIN_RATING, Rating
+
+
+FACTORS_DIR = 'recommendations'
+CURRENT_FILE = 'current.json'
+KEEP_VERSIONS = 2
+ARRAYS = ['user_ids', 'user_factors', 'movie_ids', 'movie_factors']
+
+
+def centered(matrix):
+    """Return copy of csr matrix with mean rating subtracted from its entries, and the mean."""
+    matrix = matrix.astype(np.float32, copy=True)
+    mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+    matrix.data -= mean
+    return matrix, mean
+
+
+def solve_rows(matrix, fixed, regularization, block_ratings):
+    """
+    Return factors of rows of csr matrix minimizing squared error on its
+    entries for fixed factors of its columns, with regularization weighted
+    by number of entries of a row (ALS-WR). Normal equations of rows holding
+    together about `block_ratings` entries are solved at once.
+    """
+    count, size = matrix.shape[0], fixed.shape[1]
+    result = np.zeros((count, size), dtype=np.float32)
+    identity = np.eye(size, dtype=np.float32)
+    start = 0
+    while start < count:
+        stop = int(np.searchsorted(
+            matrix.indptr, matrix.indptr[start] + block_ratings, side='right')) - 1
+        stop = min(max(stop, start + 1), count)
+        first, last = matrix.indptr[start], matrix.indptr[stop]
+        vectors = fixed[matrix.indices[first:last]]
+        lengths = np.diff(matrix.indptr[start:stop + 1])
+
+        # sums of rated column factors per row
+        rows = sparse.csr_matrix(
+            (matrix.data[first:last],
+             np.arange(last - first),
+             matrix.indptr[start:stop + 1] - first),
+            shape=(stop - start, last - first))
+        targets = rows @ vectors
+
+        # gram matrices of column factors per row, each one is a single BLAS call
+        gram = np.empty((stop - start, size, size), dtype=np.float32)
+        bounds = matrix.indptr[start:stop + 1] - first
+        for row in range(stop - start):
+            rated = vectors[bounds[row]:bounds[row + 1]]
+            np.dot(rated.T, rated, out=gram[row])
+
+        penalty = regularization * np.maximum(lengths, 1)[:, None, None] * identity
+        result[start:stop] = np.linalg.solve(gram + penalty, targets[:, :, None])[:, :, 0]
+        start = stop
+    return result
+
+
+def train_als(matrix, factors, iterations, regularization, block_ratings, report=None):
+    """
+    Return (user factors, movie factors, mean rating) of user x movie csr
+    matrix trained with alternating least squares on mean centered ratings.
+    `report(iteration, rmse)` is called after every iteration.
+    """
+    matrix, mean = centered(matrix)
+    transposed = matrix.T.tocsr()
+    generator = np.random.default_rng(0)
+    movie_factors = generator.normal(
+        scale=0.1, size=(matrix.shape[1], factors)).astype(np.float32)
+    for iteration in range(1, iterations + 1):
+        user_factors = solve_rows(matrix, movie_factors, regularization, block_ratings)
+        movie_factors = solve_rows(transposed, user_factors, regularization, block_ratings)
+        if report is not None:
+            report(iteration, rmse(matrix, user_factors, movie_factors))
+    return user_factors, movie_factors, mean
+
+
+def train_svd(matrix, factors):
+    """
+    Return (user factors, movie factors, mean rating) of user x movie csr
+    matrix from truncated SVD of mean centered ratings.
+    """
+    matrix, mean = centered(matrix)
+    factors = min(factors, min(matrix.shape) - 1)
+    users, values, movies = svds(matrix, k=factors)
+    scale = np.sqrt(values)
+    return (
+        (users * scale).astype(np.float32),
+        (movies.T * scale).astype(np.float32),
+        mean
+    )
+
+
+def rmse(matrix, user_factors, movie_factors, chunk_size=1000000):
+    """Return root mean squared error of factors on entries of centered csr matrix."""
+    if not matrix.nnz:
+        return 0.0
+    coo = matrix.tocoo()
+    error = 0.0
+    for start in range(0, coo.nnz, chunk_size):
+        stop = start + chunk_size
+        predicted = np.einsum(
+            'ij,ij->i',
+            user_factors[coo.row[start:stop]],
+            movie_factors[coo.col[start:stop]])
+        error += float(((coo.data[start:stop] - predicted) ** 2).sum())
+    return (error / coo.nnz) ** 0.5
+
+
+def factors_root():
+    return os.path.join(settings.MODEL_DATA_DIR, FACTORS_DIR)
+
+
+def save_factors(user_ids, user_factors, movie_ids, movie_factors, mean):
+    """
+    Save factors to a new directory and make it current.
+    Return path of the directory. Only the newest versions are kept,
+    workers still mapping a removed version keep reading it until reload.
+    """
+    root = factors_root()
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    arrays = {
+        'user_ids': user_ids,
+        'user_factors': user_factors,
+        'movie_ids': movie_ids,
+        'movie_factors': movie_factors,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array))
+
+    current = os.path.join(root, CURRENT_FILE)
+    with open(f'{current}.tmp', 'w') as f:
+        json.dump({'version': version, 'mean': mean}, f)
+    os.replace(f'{current}.tmp', current)
+
+    versions = sorted(
+        name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return path
+
+
+class Factors:
+    """Memory-mapped factors of one version."""
+
+    def __init__(self, path, mean):
+        self.mean = mean
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    def user_index(self, user_id):
+        """Return row of user in user factors, None if user was not trained."""
+        index = int(np.searchsorted(self.user_ids, user_id))
+        if index < len(self.user_ids) and self.user_ids[index] == user_id:
+            return index
+        return None
+
+    def movie_indexes(self, movie_ids):
+        """Return rows of trained movies among given movie ids."""
+        if not len(self.movie_ids):
+            return np.array([], dtype=np.int64)
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        indexes = np.searchsorted(self.movie_ids, movie_ids).clip(max=len(self.movie_ids) - 1)
+        return indexes[self.movie_ids[indexes] == movie_ids]
+
+
+_loaded = dict()
+
+
+def get_factors():
+    """Return current factors, mapped again when a new version is saved, None if not trained."""
+    current = os.path.join(factors_root(), CURRENT_FILE)
+    try:
+        modified = os.stat(current).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _loaded.get('modified') != modified:
+        with open(current) as f:
+            data = json.load(f)
+        _loaded['factors'] = Factors(
+            os.path.join(factors_root(), data['version']), data['mean'])
+        _loaded['modified'] = modified
+    return _loaded['factors']
+
+
+def recommend(user_id, count):
+    """
+    Return list of (movie id, predicted rating) of top movies not rated by
+    user yet, best first, None if there are no factors of the user.
+    """
+    factors = get_factors()
+    if factors is None:
+        return None
+    index = factors.user_index(user_id)
+    if index is None:
+        return None
+
+    scores = factors.movie_factors @ factors.user_factors[index]
+    rated = Rating.objects.filter(user_id=user_id).values_list('movie_id', flat=True)
+    scores[factors.movie_indexes(list(rated))] = -np.inf
+
+    count = min(count, int(np.isfinite(scores).sum()))
+    if count <= 0:
+        return []
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top])]
+    predicted = np.clip(factors.mean + scores[top].astype(np.float64), MIN_RATING, MAX_RATING)
+    return list(zip(factors.movie_ids[top].tolist(), predicted.round(2).tolist()))
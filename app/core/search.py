@@ -0,0 +1,64 @@
+"""
+Full-text search of movies and artists.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast, Concat, Greatest
+
+from core.models import Artist, Movie
+
+
+SEARCH_CONFIG = 'english'
+
+# title weighs the most, then names of directors and actors, then overview
+UPDATE_SEARCH_VECTOR = f"""
+    UPDATE {Movie._meta.db_table} AS m SET search_vector =
+        setweight(to_tsvector(%(config)s::regconfig, m.title), 'A') ||
+        setweight(to_tsvector(%(config)s::regconfig, coalesce((
+            SELECT string_agg(a.first_name || ' ' || a.last_name, ' ')
+            FROM {Artist._meta.db_table} AS a
+            WHERE a.id IN (
+                SELECT artist_id FROM {Movie.director.through._meta.db_table}
+                WHERE movie_id = m.id
+                UNION
+                SELECT artist_id FROM {Movie.actors.through._meta.db_table}
+                WHERE movie_id = m.id
+            )
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s::regconfig, coalesce(m.overview, '')), 'C')
+"""
+
+
+def update_search_vectors(movie_ids=None):
+    """Rebuild search vector of given movies, or of all movies if not given."""
+    sql = UPDATE_SEARCH_VECTOR
+    params = {'config': SEARCH_CONFIG}
+    if movie_ids is not None:
+        sql += ' WHERE m.id = ANY(%(ids)s)'
+        params['ids'] = list(movie_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def search_movies(queryset, text):
+    """
+    Filter movies matching text and annotate them with rank.
+    Words are matched with the search vector, typos in title with trigrams.
+    Rank is cast to double precision so it survives a round trip through
+    pagination cursor exactly.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(rank=Cast(
+        SearchRank(F('search_vector'), query) + TrigramSimilarity('title', text),
+        FloatField()
+    )).filter(Q(search_vector=query) | Q(title__trigram_similar=text))
+
+
+def search_artists(queryset, text):
+    """Filter artists with first or last name similar to text and rank them."""
+    return queryset.annotate(rank=Cast(Greatest(
+        TrigramSimilarity('first_name', text),
+        TrigramSimilarity('last_name', text),
+        TrigramSimilarity(Concat('first_name', Value(' '), 'last_name'), text),
+    ), FloatField())).filter(Q(first_name__trigram_similar=text) | Q(last_name__trigram_similar=text))
@@ -0,0 +1,160 @@
+"""
+Item-item collaborative filtering of movies.
+
+User x movie ratings are loaded into a sparse matrix and similarities of
+movie columns are computed in blocks of rows of the movie x movie product,
+so memory stays bounded by the block size whatever the number of movies.
+Only top k neighbours of every movie are kept and stored in the database.
+"""
+import io
+
+import numpy as np
+from scipy import sparse
+
+from django.db import connection, transaction
+
+from core.models import Movie, MovieNeighbour, Rating
+
+
+FETCH_SIZE = 100000
+WRITE_SIZE = 1000000
+ADJUSTED_COSINE = 'adjusted'
+COSINE = 'cosine'
+
+
+def load_rating_matrix():
+    """
+    Return user x movie csr matrix of ratings with arrays of user ids of
+    its rows and movie ids of its columns. Ratings without user are skipped,
+    repeated ratings of a movie by the same user are averaged.
+    """
+    users, movies, ratings = [], [], []
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f'SELECT user_id, movie_id_id, rating FROM {Rating._meta.db_table} '
+            'WHERE user_id IS NOT NULL'
+        )
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.int64)
+            users.append(block[:, 0])
+            movies.append(block[:, 1])
+            ratings.append(block[:, 2].astype(np.float32))
+
+    if not ratings:
+        empty = np.array([], dtype=np.int64)
+        return sparse.csr_matrix((0, 0), dtype=np.float32), empty, empty
+
+    user_ids, rows = np.unique(np.concatenate(users), return_inverse=True)
+    movie_ids, columns = np.unique(np.concatenate(movies), return_inverse=True)
+    ratings = np.concatenate(ratings)
+    shape = (len(user_ids), len(movie_ids))
+
+    matrix = sparse.csr_matrix((ratings, (rows, columns)), shape=shape)
+    counts = sparse.csr_matrix(
+        (np.ones_like(ratings), (rows, columns)), shape=shape)
+    matrix.sum_duplicates()
+    counts.sum_duplicates()
+    matrix.data /= counts.data
+    return matrix, user_ids, movie_ids
+
+
+def normalized_columns(matrix, metric):
+    """
+    Return csc matrix with unit length columns, centered by mean rating
+    of every user first for adjusted cosine.
+    """
+    matrix = matrix.astype(np.float32, copy=True)
+    if metric == ADJUSTED_COSINE:
+        counts = np.diff(matrix.indptr)
+        means = np.asarray(matrix.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        matrix.data -= np.repeat(means, counts).astype(np.float32)
+    columns = matrix.tocsc()
+    norms = np.sqrt(np.asarray(columns.multiply(columns).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return (columns @ sparse.diags(1 / norms)).tocsc().astype(np.float32)
+
+
+def top_neighbours(matrix, top_k, metric=ADJUSTED_COSINE, shrinkage=0, block_size=1000):
+    """
+    Yield (column indexes, neighbour indexes, scores) arrays with top k
+    most similar other columns of every column of user x movie matrix,
+    one block of columns at a time. Only positive similarities are kept.
+    Similarity of movies rated together by few users is shrunk by
+    co-ratings / (co-ratings + shrinkage).
+    """
+    columns = normalized_columns(matrix, metric)
+    rows = columns.T.tocsr()
+    adjust = None
+    if shrinkage:
+        pattern = rows.copy()
+        pattern.data[:] = 1
+        pattern_columns = pattern.T.tocsc()
+
+        def adjust(start, stop, scores):
+            together = (pattern[start:stop] @ pattern_columns).toarray()
+            scores *= together / (together + shrinkage)
+
+    yield from top_products(rows, columns, top_k, block_size, adjust)
+
+
+def top_products(rows, columns, top_k, block_size=1000, adjust=None):
+    """
+    Yield (row indexes, column indexes, scores) arrays with top k positive
+    products of every row of `rows` with columns of `columns`, skipping
+    the product of row i with column i, one block of rows at a time.
+    `adjust(start, stop, scores)` can modify dense scores of a block in place.
+    """
+    count = rows.shape[0]
+    k = min(top_k, columns.shape[1] - 1)
+    if k <= 0:
+        return
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        scores = (rows[start:stop] @ columns).toarray()
+        if adjust is not None:
+            adjust(start, stop, scores)
+        block = np.arange(stop - start)
+        scores[block, block + start] = -np.inf
+
+        neighbours = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, neighbours, axis=1)
+        sources = np.repeat(np.arange(start, stop), k).reshape(-1, k)
+        keep = top_scores > 0
+        yield sources[keep], neighbours[keep], top_scores[keep]
+
+
+def save_neighbours(kind, movie_ids, neighbour_ids, scores):
+    """
+    Replace stored neighbours of given kind with COPY.
+    Movies deleted since the neighbours were computed are skipped.
+    """
+    table = MovieNeighbour._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        MovieNeighbour.objects.filter(kind=kind).delete()
+        cursor.execute(
+            'CREATE TEMPORARY TABLE new_neighbours '
+            '(movie_id bigint, neighbour_id bigint, score double precision) '
+            'ON COMMIT DROP'
+        )
+        for start in range(0, len(scores), WRITE_SIZE):
+            stop = start + WRITE_SIZE
+            buffer = io.StringIO(''.join(
+                f'{movie_id}\t{neighbour_id}\t{score!r}\n'
+                for movie_id, neighbour_id, score in zip(
+                    movie_ids[start:stop].tolist(),
+                    neighbour_ids[start:stop].tolist(),
+                    scores[start:stop].tolist())
+            ))
+            cursor.copy_expert(
+                'COPY new_neighbours (movie_id, neighbour_id, score) FROM STDIN', buffer)
+        cursor.execute(
+            f'INSERT INTO {table} (movie_id, neighbour_id, kind, score) '
+            'SELECT n.movie_id, n.neighbour_id, %s, n.score FROM new_neighbours AS n '
+            f'JOIN {Movie._meta.db_table} AS m ON m.id = n.movie_id '
+            f'JOIN {Movie._meta.db_table} AS o ON o.id = n.neighbour_id',
+            [kind]
+        )
+        return cursor.rowcount
@@ -1,17 +1,96 @@
 import csv
+import hashlib
 import os
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
-from core.models import Movie, Artist, Genre
+from core.bulk import CatalogResolver, reserve_ids
+from core.cache import bump_generation
+from core.models import ChartEntry, Movie, Artist, Genre
+from core.search import update_search_vectors
+from movie.autocomplete import bump_version
+
 
+DEFAULT_FILE = os.path.join('example_data', 'imdb_top_1000.csv')
+DEFAULT_CHUNK_SIZE = 5000
+STARS = ['Star1', 'Star2', 'Star3', 'Star4']
 
-def run():
+
+def run(*args):
     """
     Import example data from csv file.
     Dataset from: https://www.kaggle.com/datasets/harshitshankhdhar/imdb-dataset-of-top-1000-movies-and-tv-shows
+
+    Optional script arguments (--script-args):
+        bulk            import file in chunks with set-based queries
+        sync            write only movies added, changed or removed since
+                        the last import, ratings of kept movies stay intact
+        file=<path>     csv file to import
+        chunk_size=<n>  number of rows committed in one transaction
+    """
+    options = {'mode': 'rows', 'file': DEFAULT_FILE, 'chunk_size': DEFAULT_CHUNK_SIZE}
+    for arg in args:
+        key, _, value = arg.partition('=')
+        if not value:
+            options['mode'] = key
+        elif key == 'chunk_size':
+            options['chunk_size'] = int(value)
+        else:
+            options[key] = value
+
+    if options['mode'] == 'bulk':
+        bulk_import(options['file'], options['chunk_size'])
+    elif options['mode'] == 'sync':
+        sync_import(options['file'], options['chunk_size'])
+    else:
+        rows_import(options['file'])
+    bump_generation()
+    bump_version()
+
+
+def split_name(full_name):
+    """Split full name into first name and last name."""
+    data = full_name.split(maxsplit=1)
+    return data[0], data[-1]
+
+
+def fingerprint(*values):
+    """Return hex digest of values."""
+    return hashlib.sha1('\x1f'.join(str(value) for value in values).encode()).hexdigest()
+
+
+def parse_row(row):
+    """
+    Return movie data from csv row.
+    Movie is identified by a key built from title, year and director,
+    hash of the remaining columns tells if the movie has changed.
     """
+    year = row['Released_Year'] if row['Released_Year'].isnumeric() else '0'
+    data = {
+        'title': row['Series_Title'],
+        'year': int(year),
+        'overview': row['Overview'],
+        'genres': list(dict.fromkeys(row['Genre'].strip('"').split(', '))),
+        'director': split_name(row['Director']),
+        'actors': list(dict.fromkeys(split_name(row[star]) for star in STARS)),
+    }
+    data['key'] = fingerprint(data['title'], data['year'], *data['director'])
+    data['hash'] = fingerprint(
+        data['overview'],
+        *sorted(data['genres']),
+        *sorted(' '.join(actor) for actor in data['actors'])
+    )
+    return data
+
 
-    file_path = os.path.join('example_data', 'imdb_top_1000.csv')
+def rows_import(file_path):
+    """Import file row by row."""
 
     Movie.objects.all().delete()
 
@@ -20,26 +99,27 @@ def run():
 
         for row in reader:
 
+            parsed = parse_row(row)
             genre_models = list()
 
             genres = row['Genre'].strip('"').split(', ')
             for genre in genres:
                 g, _ = Genre.objects.get_or_create(genre=genre)
                 genre_models.append(g)
-            
+
             data = row['Director'].split(maxsplit=1)
             name = data[0]
             surname = data[-1]
 
             director, created = Artist.objects.get_or_create(
-                first_name=name, 
+                first_name=name,
                 last_name=surname)
-            
+
             if created:
                 director.slug = slugify(f"{name} {surname} {director.id}")
                 director.save()
 
-            
+
             year = row['Released_Year'] if row['Released_Year'].isnumeric() else '0'
 
             movie = Movie(
@@ -51,12 +131,12 @@ def run():
             movie.save()
             movie.director.add(director)
 
-            for actor in ['Star1', 'Star2', 'Star3', 'Star4']:
+            for actor in STARS:
                 data = row[actor].split(maxsplit=1)
                 name = data[0]
                 surname = data[-1]
                 star, created = Artist.objects.get_or_create(
-                    first_name=name, 
+                    first_name=name,
                     last_name=surname)
                 if created:
                     star.slug = slugify(f"{name} {surname} {star.id}")
@@ -65,6 +145,231 @@ def run():
 
             for genre in genre_models:
                 movie.genre.add(genre)
-            
+
             movie.slug = f'{slugify(movie.title[:45])}-{movie.id}'
+            movie.source_key = parsed['key']
+            movie.source_hash = parsed['hash']
             movie.save()
+
+    update_search_vectors()
+
+
+def bulk_import(file_path, chunk_size):
+    """
+    Stream file in chunks, each chunk is inserted in its own transaction
+    with a constant number of queries.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE {Movie._meta.db_table} CASCADE')
+
+    resolver = CatalogResolver()
+    resolver.preload()
+
+    imported = 0
+    start = time.perf_counter()
+    with open(file_path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = [parse_row(row) for row in islice(reader, chunk_size)]
+            if not chunk:
+                break
+            with transaction.atomic():
+                insert_movies(chunk, resolver)
+            imported += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f'{imported} rows imported ({imported / elapsed:.0f} rows/sec)')
+
+    elapsed = time.perf_counter() - start
+    print(f'Imported {imported} rows in {elapsed:.1f}s '
+          f'({imported / max(elapsed, 1e-9):.0f} rows/sec)')
+
+
+def insert_movies(rows, resolver):
+    """Insert movies with their genres, directors and actors in bulk."""
+    genre_ids = resolver.genre_ids(
+        {genre for row in rows for genre in row['genres']})
+    artist_ids = resolver.artist_ids(
+        {artist for row in rows for artist in [row['director'], *row['actors']]})
+
+    movie_ids = reserve_ids(Movie, len(rows))
+    movies, genre_links, director_links, actor_links = [], [], [], []
+    for movie_id, row in zip(movie_ids, rows):
+        movies.append(Movie(
+            id=movie_id,
+            title=row['title'],
+            year=row['year'],
+            overview=row['overview'],
+            slug=f"{slugify(row['title'][:45])}-{movie_id}",
+            source_key=row['key'],
+            source_hash=row['hash']
+        ))
+        genre_links += [
+            Movie.genre.through(movie_id=movie_id, genre_id=genre_ids[genre])
+            for genre in row['genres']
+        ]
+        director_links.append(Movie.director.through(
+            movie_id=movie_id, artist_id=artist_ids[row['director']]))
+        actor_links += [
+            Movie.actors.through(movie_id=movie_id, artist_id=artist_ids[actor])
+            for actor in row['actors']
+        ]
+
+    Movie.objects.bulk_create(movies)
+    Movie.genre.through.objects.bulk_create(genre_links)
+    Movie.director.through.objects.bulk_create(director_links)
+    Movie.actors.through.objects.bulk_create(actor_links)
+    update_search_vectors(movie_ids)
+
+
+def sync_import(file_path, chunk_size):
+    """
+    Compare file with movies imported before and write only the difference:
+    new rows are inserted, changed rows are updated and movies missing
+    from the file are removed.
+    """
+    stored = stored_fingerprints()
+    resolver = CatalogResolver()
+    resolver.preload()
+
+    summary = Counter()
+    seen = set()
+    start = time.perf_counter()
+    with open(file_path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = [parse_row(row) for row in islice(reader, chunk_size)]
+            if not chunk:
+                break
+            with transaction.atomic():
+                sync_movies(chunk, stored, seen, resolver, summary)
+
+    # movies without source hash were not imported from file, keep them
+    removed = [
+        movie_id for key, (movie_id, source_hash) in stored.items()
+        if key not in seen and source_hash is not None
+    ]
+    for i in range(0, len(removed), chunk_size):
+        with transaction.atomic():
+            Movie.objects.filter(id__in=removed[i:i + chunk_size]).delete()
+    summary['removed'] = len(removed)
+
+    elapsed = time.perf_counter() - start
+    print(f"Synchronized in {elapsed:.1f}s: "
+          f"{summary['created']} created, {summary['updated']} updated, "
+          f"{summary['unchanged']} unchanged, {summary['removed']} removed, "
+          f"{summary['links_added']} links added, "
+          f"{summary['links_removed']} links removed")
+
+
+def stored_fingerprints():
+    """
+    Return dict of source key -> (movie id, source hash) for stored movies.
+    Movies imported before fingerprints were kept are matched by title,
+    year and director and get them on their first synchronization.
+    """
+    stored = dict()
+    keyed = Movie.objects.exclude(source_key=None).values_list(
+        'id', 'source_key', 'source_hash')
+    for movie_id, key, source_hash in keyed.iterator():
+        stored[key] = (movie_id, source_hash)
+
+    unkeyed = Movie.objects.filter(source_key=None).values_list(
+        'id', 'title', 'year', 'director__first_name', 'director__last_name')
+    for movie_id, title, year, first_name, last_name in unkeyed.iterator():
+        stored.setdefault(
+            fingerprint(title, year, first_name, last_name), (movie_id, None))
+    return stored
+
+
+def sync_movies(rows, stored, seen, resolver, summary):
+    """Insert new and update changed movies from chunk of rows."""
+    new, changed = [], dict()
+    for row in rows:
+        if row['key'] in seen:
+            continue
+        seen.add(row['key'])
+        movie_id, source_hash = stored.get(row['key'], (None, None))
+        if movie_id is None:
+            new.append(row)
+        elif source_hash != row['hash']:
+            changed[movie_id] = row
+        else:
+            summary['unchanged'] += 1
+
+    if new:
+        insert_movies(new, resolver)
+        summary['created'] += len(new)
+    if changed:
+        update_movies(changed, resolver, summary)
+        summary['updated'] += len(changed)
+
+
+def update_movies(changed, resolver, summary):
+    """Update changed movies and their genres, directors and actors."""
+    rows = changed.values()
+    genre_ids = resolver.genre_ids(
+        {genre for row in rows for genre in row['genres']})
+    artist_ids = resolver.artist_ids(
+        {artist for row in rows for artist in [row['director'], *row['actors']]})
+
+    today = date.today()
+    now = timezone.now()
+    Movie.objects.bulk_update([
+        Movie(
+            id=movie_id,
+            overview=row['overview'],
+            source_key=row['key'],
+            source_hash=row['hash'],
+            updated=today,
+            modified=now
+        )
+        for movie_id, row in changed.items()
+    ], ['overview', 'source_key', 'source_hash', 'updated', 'modified'])
+
+    links = [
+        (Movie.genre.through, 'genre_id', {
+            movie_id: {genre_ids[genre] for genre in row['genres']}
+            for movie_id, row in changed.items()
+        }),
+        (Movie.director.through, 'artist_id', {
+            movie_id: {artist_ids[row['director']]}
+            for movie_id, row in changed.items()
+        }),
+        (Movie.actors.through, 'artist_id', {
+            movie_id: {artist_ids[actor] for actor in row['actors']}
+            for movie_id, row in changed.items()
+        }),
+    ]
+    for through, field, desired in links:
+        added, removed = diff_links(through, field, desired)
+        summary['links_added'] += added
+        summary['links_removed'] += removed
+    update_search_vectors(changed.keys())
+    # genres of kept ratings may have changed
+    ChartEntry.objects.update_movies(changed.keys())
+
+
+def diff_links(through, field, desired):
+    """
+    Make M2M links of movies equal to desired dict of movie id -> set of ids.
+    Only missing links are inserted and only stale links are deleted.
+    """
+    current = defaultdict(set)
+    stale = list()
+    links = through.objects.filter(movie_id__in=desired).values_list(
+        'id', 'movie_id', field)
+    for link_id, movie_id, target_id in links:
+        if target_id in desired[movie_id]:
+            current[movie_id].add(target_id)
+        else:
+            stale.append(link_id)
+
+    missing = [
+        through(movie_id=movie_id, **{field: target_id})
+        for movie_id, targets in desired.items()
+        for target_id in targets - current[movie_id]
+    ]
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    through.objects.bulk_create(missing)
+    return len(missing), len(stale)
@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for production serving.
+
+Application code is imported once by the master process and shared by
+forked workers. Every worker serves VIEW_THREADS requests at once with
+threads (WSGI) or with async views under uvicorn workers (ASGI=1), and
+borrows database connections from its own bounded pool (core.pool).
+"""
+import glob
+import multiprocessing
+import os
+
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+if os.environ.get('ASGI') == '1':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('VIEW_THREADS', 16))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# restart workers now and then, so memory leaks cannot grow forever
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = '-'
+
+
+def on_starting(server):
+    """
+    Refuse to run several workers with a cache local to each of them, and
+    remove metrics files of workers of the previous run (see core.metrics).
+    """
+    # response cache versions and token invalidations must reach all workers
+    from django.conf import settings
+    backend = settings.CACHES[settings.RESPONSE_CACHE_ALIAS]['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('LocMemCache'):
+        raise SystemExit(
+            f'{server.cfg.workers} workers need a shared cache, set CACHE_BACKEND and '
+            f'CACHE_LOCATION (e.g. Redis) or WEB_CONCURRENCY=1.')
+    if os.environ.get('METRICS_DIR'):
+        for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+            os.remove(path)
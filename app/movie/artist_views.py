@@ -4,13 +4,69 @@ Views for movie/artist API.
 
 from rest_framework import generics
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.utils.urls import replace_query_param
 
+from django.db.models import (
+    Case, CharField, Count, Exists, F, Max, OuterRef, Q, Subquery, Value, When
+)
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils.text import slugify
 
-from core.models import Movie, Genre, Artist
+from core import cache
+from core.authentication import CachedTokenAuthentication
+from core.concurrent import run_concurrently
+from core.conditional import conditional_get, make_etag
+from core.models import Movie, Genre, Artist, RATING_ORDERING
 from core.permissions import IsAdmin
-from movie import serializers
+from core.search import search_artists
+from movie import autocomplete, fast_serializers, serializers
+from movie.pagination import KeysetPagination
+
+
+DIRECTED = 'directed'
+STARRED = 'starred'
+BOTH = 'both'
+ROLES = [DIRECTED, STARRED]
+
+# order_by value -> ordering expression of filmography, newest or best first
+FILMOGRAPHY_ORDERINGS = {
+    'year': F('year'),
+    'rating': RATING_ORDERING,
+}
+
+
+def filmography(artist_id, role=None):
+    """
+    Return movies of artist annotated with `role` of the artist,
+    limited to movies the artist directed or starred in if role is given.
+    Artist id can be an expression, e.g. subquery of artist by slug.
+    """
+    directed = Exists(Movie.director.through.objects.filter(
+        movie_id=OuterRef('pk'), artist_id=artist_id))
+    starred = Exists(Movie.actors.through.objects.filter(
+        movie_id=OuterRef('pk'), artist_id=artist_id))
+    queryset = Movie.objects.annotate(directed=directed, starred=starred).annotate(
+        role=Case(
+            When(directed=True, starred=True, then=Value(BOTH)),
+            When(directed=True, then=Value(DIRECTED)),
+            default=Value(STARRED),
+            output_field=CharField()
+        )
+    )
+    if role == DIRECTED:
+        return queryset.filter(directed=True)
+    if role == STARRED:
+        return queryset.filter(starred=True)
+    return queryset.filter(Q(directed=True) | Q(starred=True))
+
+
+def get_filmography_ordering(request):
+    """Return filmography ordering expression from `order_by` query parameter."""
+    order_by = request.query_params.get('order_by')
+    if order_by not in FILMOGRAPHY_ORDERINGS:
+        order_by = 'year'
+    return order_by, FILMOGRAPHY_ORDERINGS[order_by]
 
 
 class RetrieveArtistView(generics.RetrieveAPIView):
@@ -18,33 +74,120 @@ class RetrieveArtistView(generics.RetrieveAPIView):
     serializer_class = serializers.ArtistSerializer
     queryset = Artist.objects.all()
     lookup_field = "slug"
-
+    # number of movies of each role embedded in artist detail
+    page_size = 20
+
+    def get_validators(self, request, slug):
+        """Return ETag and Last-Modified of artist from their movies."""
+        stats = Movie.objects.filter(
+            Q(director__slug=slug) | Q(actors__slug=slug)
+        ).aggregate(last_modified=Max('modified'), count=Count('id', distinct=True))
+        etag = make_etag('artist', slug, stats['count'], stats['last_modified'])
+        return etag, stats['last_modified']
+
+    @conditional_get('get_validators')
     def retrieve(self, request, slug):
         """Override retrieve method to retrieve artist with movies."""
+        order_by, _ = get_filmography_ordering(request)
+        data = cache.cached_data(
+            cache.ARTIST, slug, self.get_detail_data, variant=order_by)
+        return Response(data)
 
-        # retrieve artist
-        instance = self.get_object()
+    def get_detail_data(self):
+        """
+        Return data of artist with first page of directed and starred movies.
+        Both pages are fetched with a single UNION ALL query, concurrently
+        with the artist. The following pages are served by filmography
+        endpoint linked in `*_next` fields.
+        """
+        instance, first_pages = run_concurrently(self.get_object, self.get_first_pages)
         artist_serializer = self.get_serializer(instance)
-
-        # retrieve directed movies
-        directed = Movie.objects.filter(director=instance.id)
-        directed_serializer = serializers.BasicMovieSerializer(directed, many=True)
-
-        # retrieve starred movies
-        starred = Movie.objects.filter(actors=instance.id)
-        starred_serializer = serializers.BasicMovieSerializer(starred, many=True)
+        order_by, _ = get_filmography_ordering(self.request)
+        movies = {role: [] for role in ROLES}
+        for movie in first_pages:
+            movies[movie.page].append(movie)
 
         data = artist_serializer.data
-        data['Directed'] = directed_serializer.data
-        data['Starred'] = starred_serializer.data
+        for role in ROLES:
+            # union does not keep order of its parts
+            page = sorted(
+                movies[role], key=lambda movie: (movie.keyset_value, movie.id), reverse=True)
+            serializer = serializers.FilmographyMovieSerializer(
+                page[:self.page_size], many=True)
+            data[role.capitalize()] = serializer.data
+            data[f'{role}_next'] = self.get_next_link(
+                instance, role, order_by, page) if len(page) > self.page_size else None
+
+        return data
+
+    def get_first_pages(self):
+        """Return list of movies of first page of every role, annotated with `page` role."""
+        _, expression = get_filmography_ordering(self.request)
+        artist_id = Subquery(Artist.objects.filter(slug=self.kwargs['slug']).values('id')[:1])
+        pages = [
+            filmography(artist_id, role).annotate(
+                keyset_value=expression, page=Value(role, output_field=CharField())
+            ).order_by(F('keyset_value').desc(), F('id').desc())[:self.page_size + 1]
+            for role in ROLES
+        ]
+        return list(pages[0].union(*pages[1:], all=True))
+
+    def get_next_link(self, instance, role, order_by, page):
+        """Return link to the next page of artist movies of given role."""
+        last = page[self.page_size - 1]
+        url = self.request.build_absolute_uri(
+            reverse('movie:artist-movies', args=[instance.slug]))
+        url = replace_query_param(url, 'role', role)
+        url = replace_query_param(url, 'order_by', order_by)
+        cursor = KeysetPagination().encode_cursor(last.keyset_value, last.id)
+        return replace_query_param(url, KeysetPagination.cursor_query_param, cursor)
+
+
+class ArtistMoviesView(generics.ListAPIView):
+    """
+    List movies of artist with their role, optionally filtered by `role`
+    (directed or starred) and ordered by `order_by` (year or rating).
+    """
+
+    serializer_class = serializers.FilmographyMovieSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        artist = get_object_or_404(Artist.objects.only('id'), slug=self.kwargs['slug'])
+        return filmography(artist.id, self.request.query_params.get('role'))
+
+    def get_keyset_ordering(self):
+        """Return ordering expression and direction used by pagination."""
+        _, expression = get_filmography_ordering(self.request)
+        return expression, True
+
+    def list(self, request, *args, **kwargs):
+        """List movies serialized from plain rows."""
+        queryset = self.get_queryset().values(*fast_serializers.FILMOGRAPHY_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(fast_serializers.filmography(page))
+
+
+class SearchArtistView(generics.ListAPIView):
+    """List artists with names similar to `search` query parameter."""
+
+    serializer_class = serializers.SearchArtistSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        search = self.request.query_params.get('search', '')
+        return search_artists(Artist.objects.all(), search)
+
+    def get_keyset_ordering(self):
+        """Return ordering expression and direction used by pagination."""
+        return F('rank'), True
 
-        return Response(data)
 
 class CreateArtistView(generics.CreateAPIView):
 
     serializer_class = serializers.ArtistSerializer
     permission_classes = [IsAdmin]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
 
     def create(self, request):
         """Override create method to autogenerate a slug."""
@@ -57,6 +200,7 @@ class CreateArtistView(generics.CreateAPIView):
             slug_artist = f"{instance.first_name} {instance.last_name} {instance.id}"
             instance.slug = slugify(slug_artist)
             instance.save()
-        
+        autocomplete.add(artists=[instance])
+
         return Response(serializer.data, status=200)
 
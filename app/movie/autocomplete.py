@@ -0,0 +1,222 @@
+"""
+In-memory prefix index of movie titles and artist names for typeahead.
+
+Every word-start suffix of a name ("the godfather", "godfather") is kept
+in a sorted list, so names matching a prefix are a contiguous range found
+with bisect. Best matches of short prefixes, which match a lot of names,
+are precomputed. Lookups never touch the database.
+
+Names created in this process are inserted into its index right away,
+unless there are more than INSERT_LIMIT of them. Other processes, and
+this one for bigger batches, are told by a version in the shared cache
+and rebuild their index in the background, serving the old one until
+it is ready.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from core.models import Artist, Movie
+
+
+MOVIE = 'movie'
+ARTIST = 'artist'
+VERSION_KEY = 'autocomplete:version'
+# prefixes up to this length have precomputed best matches
+PRECOMPUTED_LENGTH = 3
+TOP_SIZE = 20
+# seconds between checks of the shared version and maximum age of index
+CHECK_INTERVAL = 5
+MAX_AGE = 60 * 60
+# created names inserted one by one into the index of the process, more
+# are left to the background rebuild instead of blocking the request
+INSERT_LIMIT = 50
+
+
+def normalize(text):
+    """Return lowercase text without accents and punctuation."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def word_suffixes(text):
+    """Return normalized text starting from each of its words."""
+    words = normalize(text).split()
+    return [' '.join(words[index:]) for index in range(len(words))]
+
+
+class PrefixIndex:
+    """Sorted word-start suffixes of names with references to their items."""
+
+    def __init__(self, items, version=None):
+        # item: (popularity, kind, id, label, slug)
+        self.items = []
+        self.known = set()
+        self.entries = []
+        self.top = dict()
+        self.version = version
+        self.built = time.monotonic()
+        for item in items:
+            self.add_item(item, sort=False)
+        self.entries.sort()
+        for prefix, indexes in self.top.items():
+            self.top[prefix] = heapq.nlargest(TOP_SIZE, indexes, key=self.rank)
+
+    def rank(self, index):
+        popularity, _, _, label, _ = self.items[index]
+        return popularity, -len(label)
+
+    def add_item(self, item, sort=True):
+        """Add item, keeping entries sorted unless `sort` is False."""
+        if (item[1], item[2]) in self.known:
+            return
+        self.known.add((item[1], item[2]))
+        index = len(self.items)
+        self.items.append(item)
+        prefixes = set()
+        for key in word_suffixes(item[3]):
+            if sort:
+                insort(self.entries, (key, index))
+            else:
+                self.entries.append((key, index))
+            prefixes.update(key[:length] for length in range(1, PRECOMPUTED_LENGTH + 1))
+        for prefix in prefixes:
+            top = self.top.setdefault(prefix, [])
+            top.append(index)
+            if sort:
+                top.sort(key=self.rank, reverse=True)
+                del top[TOP_SIZE:]
+
+    def search(self, text, limit):
+        """Return items with a word starting with text, most popular first."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_LENGTH:
+            return [self.items[index] for index in self.top.get(prefix, [])[:limit]]
+
+        # keys starting with prefix sort before prefix with its last character incremented
+        start = bisect_left(self.entries, (prefix,))
+        stop = bisect_left(self.entries, (prefix[:-1] + chr(ord(prefix[-1]) + 1),), start)
+        matches = {index for _, index in self.entries[start:stop]}
+        best = heapq.nlargest(limit, matches, key=self.rank)
+        return [self.items[index] for index in best]
+
+
+def load_items():
+    """Return items of all movies and artists."""
+    items = [
+        (rating_count, MOVIE, movie_id, title, slug)
+        for movie_id, title, slug, rating_count in Movie.objects.values_list(
+            'id', 'title', 'slug', 'rating_count').iterator()
+    ]
+    movies_count = Counter()
+    for through in [Movie.director.through, Movie.actors.through]:
+        movies_count.update(dict(
+            through.objects.values('artist_id').annotate(
+                count=Count('id')).values_list('artist_id', 'count')))
+    items += [
+        (movies_count[artist_id], ARTIST, artist_id, f'{first_name} {last_name}', slug)
+        for artist_id, first_name, last_name, slug in Artist.objects.values_list(
+            'id', 'first_name', 'last_name', 'slug').iterator()
+    ]
+    return items
+
+
+def version_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+_index = None
+_lock = threading.Lock()
+_state = {'checked': 0, 'rebuilding': False}
+
+
+def rebuild(version):
+    """Build a new index and replace the current one."""
+    global _index
+    try:
+        index = PrefixIndex(load_items(), version)
+        with _lock:
+            _index = index
+    finally:
+        _state['rebuilding'] = False
+        # return connection of this thread to the pool
+        connection.close()
+
+
+def get_index():
+    """
+    Return index of this process, built on first use. Index is rebuilt in
+    a background thread when other process changes the shared version or
+    when it gets too old.
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = PrefixIndex(load_items(), version_cache().get(VERSION_KEY))
+                _state['checked'] = time.monotonic()
+        return _index
+
+    now = time.monotonic()
+    if now - _state['checked'] > CHECK_INTERVAL and not _state['rebuilding']:
+        _state['checked'] = now
+        version = version_cache().get(VERSION_KEY)
+        if version != _index.version or now - _index.built > MAX_AGE:
+            _state['rebuilding'] = True
+            threading.Thread(target=rebuild, args=(version,), daemon=True).start()
+    return _index
+
+
+def search(text, limit=10):
+    """Return list of dicts of movies and artists with a word starting with text."""
+    return [
+        {'kind': kind, 'id': item_id, 'label': label, 'slug': slug}
+        for _, kind, item_id, label, slug in get_index().search(text, limit)
+    ]
+
+
+def bump_version():
+    """Tell other processes to rebuild their index, return the new version."""
+    cache = version_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(VERSION_KEY, version, timeout=None)
+        return version
+
+
+def add(movies=(), artists=()):
+    """Add created movies and artists to index of this process and of the others."""
+    items = [(movie.rating_count, MOVIE, movie.id, movie.title, movie.slug) for movie in movies]
+    items += [
+        (0, ARTIST, artist.id, f'{artist.first_name} {artist.last_name}', artist.slug)
+        for artist in artists
+    ]
+    if not items:
+        return
+    version = bump_version()
+    if _index is None:
+        return
+    if len(items) > INSERT_LIMIT:
+        # index stays at its version, rebuild on next lookup
+        _state['checked'] = 0
+        return
+    with _lock:
+        for item in items:
+            _index.add_item(item)
+        # names added by other processes since the index was built are not in it
+        if _index.version is not None and version == _index.version + 1:
+            _index.version = version
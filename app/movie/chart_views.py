@@ -0,0 +1,40 @@
+"""
+Views for movie/charts API.
+"""
+from rest_framework import generics
+from rest_framework.exceptions import NotFound
+
+from django.db.models import F
+
+from core.charts import get_chart
+from core.models import Chart, ChartEntry
+from movie import fast_serializers, serializers
+from movie.pagination import KeysetPagination
+
+
+class ListChartView(generics.ListAPIView):
+    """List available charts."""
+    serializer_class = serializers.ChartSerializer
+    queryset = Chart.objects.select_related('genre').order_by('kind', 'decade', 'genre__genre')
+
+
+class ChartView(generics.ListAPIView):
+    """List movies of chart with the highest Bayesian average first."""
+    serializer_class = serializers.ChartEntrySerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        chart = get_chart(self.kwargs['kind'], self.kwargs.get('value'))
+        if chart is None:
+            raise NotFound('Chart not found')
+        return ChartEntry.objects.filter(chart=chart).values(
+            *fast_serializers.CHART_ENTRY_FIELDS)
+
+    def get_keyset_ordering(self):
+        """Return ordering expression and direction used by pagination."""
+        return F('score'), True
+
+    def list(self, request, *args, **kwargs):
+        """List chart entries serialized from plain rows."""
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(fast_serializers.chart_entries(page))
@@ -2,32 +2,57 @@
 Views for movie/movies API.
 """
 
+import os
+
 from rest_framework import viewsets, generics
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.views import APIView
 
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.http import FileResponse, HttpResponse
 from django.utils.text import slugify
 
-from core.models import Movie, Genre, Artist, Rating
-from core.permissions import IsAdminOrReadOnly
-from movie import serializers
+from core.models import Movie, MovieNeighbour, Genre, Artist, Rating, RATING_ORDERING
+from core import cache, content, metrics, pool, profiling
+from core.authentication import CachedTokenAuthentication
+from core.bulk import CatalogResolver, create_movies
+from core.concurrent import run_concurrently
+from core.conditional import conditional_get, make_etag
+from core.permissions import IsAdmin, IsAdminOrReadOnly
+from core.ratings import rating_stats
+from core.search import search_movies, update_search_vectors
+from movie import autocomplete, fast_serializers, serializers
+from movie.pagination import KeysetPagination, RatingCursorPagination
+
+
+# order_by value -> (ordering expression, descending)
+ORDERINGS = {
+    'rating': (RATING_ORDERING, True),
+    'title': (F('title'), False),
+}
 
 
 class MovieViewSet(viewsets.ModelViewSet):
     """View for manage movie APIs."""
     serializer_class = serializers.MovieSerializer
-    queryset = Movie.objects.all()
+    queryset = Movie.objects.prefetch_related('genre', 'director', 'actors')
     http_method_names = ['get', 'post']
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminOrReadOnly]
     lookup_field = "slug"
+    pagination_class = KeysetPagination
+    # number of newest ratings embedded in movie detail
+    detail_ratings = 10
+    # maximum number of movies created with one bulk request
+    bulk_max_size = 5000
 
     def get_queryset(self):
         """Retrieve movies with filtering and ordering."""
         queryset = self.queryset
-        ordering_field = '-average_rating'
         # filtering by title:
         title = self.request.query_params.get('title')
         if title:
@@ -38,29 +63,82 @@ class MovieViewSet(viewsets.ModelViewSet):
         if genre:
             queryset = queryset.filter(genre__genre=genre)
 
+        # full-text search:
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_movies(queryset, search)
+
         # check ordering:
+        expression, descending = self.get_keyset_ordering()
+        if descending:
+            return queryset.order_by(expression.desc(), '-id')
+        return queryset.order_by(expression.asc(), 'id')
+
+    def get_keyset_ordering(self):
+        """Return ordering expression and direction used by pagination."""
+        if self.request.query_params.get('search'):
+            return F('rank'), True
         new_ordering = self.request.query_params.get('order_by')
-        if new_ordering == 'rating':
-            ordering_field = '-average_rating'
-        elif new_ordering == 'title':
-            ordering_field = 'title'
-        return queryset.order_by(ordering_field)
+        return ORDERINGS.get(new_ordering, ORDERINGS['rating'])
     
+    def get_list_validators(self, request):
+        """Return ETag and Last-Modified of movie list from aggregates."""
+        stats = self.get_queryset().order_by().aggregate(
+            last_modified=Max('modified'), count=Count('id'))
+        etag = make_etag(
+            'movies', request.get_full_path(), stats['count'], stats['last_modified'])
+        return etag, stats['last_modified']
+
+    def get_detail_validators(self, request, slug):
+        """
+        Return ETag and Last-Modified of movie detail, ratings or statistics,
+        changed by the movie and by any of its ratings, including edited
+        comments and renamed users, which change only the ratings.
+        """
+        newest_rating = Rating.objects.filter(movie_id=OuterRef('pk')).order_by(
+            '-modified').values('modified')[:1]
+        row = Movie.objects.filter(slug=slug).values_list(
+            'modified', Subquery(newest_rating)).first()
+        if row is None:
+            return None, None
+        modified, ratings_modified = row
+        etag = make_etag(self.action, request.get_full_path(), modified, ratings_modified)
+        return etag, max(modified, ratings_modified or modified)
+
+    @conditional_get('get_list_validators')
+    def list(self, request, *args, **kwargs):
+        """List movies serialized from plain rows."""
+        queryset = self.get_queryset().prefetch_related(None).values(
+            *fast_serializers.MOVIE_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(fast_serializers.movies(page))
+
+    @conditional_get('get_detail_validators')
     def retrieve(self, request, slug):
         """Override retrieve method to retrieve movie with ratings."""
+        data = cache.cached_data(cache.MOVIE, slug, self.get_detail_data)
+        return Response(data)
 
-        # retrieve movie
-        instance = self.get_object()
+    def get_detail_data(self):
+        """
+        Return data of movie with ratings. Movie and its newest ratings
+        are retrieved concurrently.
+        """
+        instance, ratings = run_concurrently(self.get_object, self.get_newest_ratings)
         movie_serializer = self.get_serializer(instance)
-
-        # retrieve ratings
-        ratings = Rating.objects.filter(movie_id=instance.id)
         ratings_serializer = serializers.RatingSerializer(ratings, many=True)
 
         data = movie_serializer.data
+        data['rating_stats'] = rating_stats(instance.rating_histogram)
+        data['ratings_count'] = instance.rating_count
         data['Ratings'] = ratings_serializer.data
 
-        return Response(data)
+        return data
+
+    def get_newest_ratings(self):
+        """Return list of newest ratings of movie, the rest is served by ratings endpoint."""
+        return list(Rating.objects.filter(movie_id__slug=self.kwargs['slug']).select_related(
+            'user').order_by('-id')[:self.detail_ratings])
 
     def create(self, request):
         """Override create method to add genres and artists and autogenerate slug."""
@@ -79,6 +157,10 @@ class MovieViewSet(viewsets.ModelViewSet):
                 genre_model, _ = Genre.objects.get_or_create(genre=genre['genre'])
                 instance.genre.add(genre_model)
         
+        # artists whose filmography changes
+        artist_slugs = set()
+        created_artists = []
+
         # add directors
         if directors:
             for director in directors:
@@ -91,7 +173,9 @@ class MovieViewSet(viewsets.ModelViewSet):
                     director_model.slug = slugify(
                         f"{first_name} {last_name} {director_model.id}")
                     director_model.save()
+                    created_artists.append(director_model)
                 instance.director.add(director_model)
+                artist_slugs.add(director_model.slug)
 
         
         # add actors
@@ -106,20 +190,26 @@ class MovieViewSet(viewsets.ModelViewSet):
                     actor_model.slug = slugify(
                         f"{first_name} {last_name} {actor_model.id}")
                     actor_model.save()
+                    created_artists.append(actor_model)
                 instance.actors.add(actor_model)
+                artist_slugs.add(actor_model.slug)
 
         # generate slug
         if not instance.slug:
             slug_title = f"{instance.title} {instance.id}"
             instance.slug=slugify(slug_title)
         instance.save()
+        update_search_vectors([instance.id])
+        content.schedule_add_movies([instance.id])
+        autocomplete.add(movies=[instance], artists=created_artists)
+        cache.bump_artists(artist_slugs)
         return Response(serializer.data, status=200)
     
     @action(
         methods=['post'],
         detail=True,
         url_path='add_rating',
-        authentication_classes = [TokenAuthentication],
+        authentication_classes = [CachedTokenAuthentication],
         permission_classes = [IsAuthenticated]
     )
     def add_rating(self, request, slug=None):
@@ -134,25 +224,182 @@ class MovieViewSet(viewsets.ModelViewSet):
             }
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
+        # rating totals and average of the movie are updated on save
         serializer.save()
 
-        try:
-            all_movie_ratings = Rating.objects.filter(movie_id=movie_id).values('rating')
-            ratings = [rating['rating'] for rating in all_movie_ratings]
-            average = round(sum(ratings) / len(ratings), 2)
-            movie = Movie.objects.get(id=movie_id)
-            movie.average_rating = average
-            movie.save()
-        except:
-            return Response('Rating was saved, but average did not change.', status=400)
-
         return Response(serializer.data, status=200)
     
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='bulk',
+        authentication_classes = [CachedTokenAuthentication],
+        permission_classes = [IsAdmin]
+    )
+    def bulk(self, request):
+        """
+        Create movies from list with genres and artists.
+        Invalid movies are reported by their index in `errors`,
+        valid ones are created with a constant number of queries.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of movies.')
+        if len(request.data) > self.bulk_max_size:
+            raise ValidationError(
+                f'Expected at most {self.bulk_max_size} movies, got {len(request.data)}.')
+
+        # validate movies one by one, without queries
+        valid, indexes, errors = [], [], []
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                indexes.append(index)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        movies = []
+        if valid:
+            with transaction.atomic():
+                movies, artist_ids = create_movies(valid, CatalogResolver())
+                update_search_vectors([movie.id for movie in movies])
+                artists = list(Artist.objects.filter(id__in=artist_ids).only(
+                    'id', 'first_name', 'last_name', 'slug'))
+                cache.bump_artists(artist.slug for artist in artists)
+            content.schedule_add_movies([movie.id for movie in movies])
+            autocomplete.add(movies=movies, artists=artists)
+
+        created = serializers.BasicMovieSerializer(movies, many=True).data
+        return Response({
+            'created': [
+                {'index': index, **movie, 'slug': instance.slug}
+                for index, movie, instance in zip(indexes, created, movies)
+            ],
+            'errors': errors,
+        }, status=200)
+
+    @action(methods=['get'], detail=True, url_path='ratings')
+    @conditional_get('get_detail_validators')
+    def ratings(self, request, slug=None):
+        """List ratings of the movie with their users, newest first."""
+        ratings = Rating.objects.filter(movie_id__slug=slug).values(
+            *fast_serializers.RATING_FIELDS)
+        paginator = RatingCursorPagination()
+        page = paginator.paginate_queryset(ratings, request, view=self)
+        return paginator.get_paginated_response(fast_serializers.ratings(page))
+
+    @action(methods=['get'], detail=True, url_path='similar')
+    def similar(self, request, slug=None):
+        """List movies similar to the movie, computed offline, most similar first."""
+        kinds = dict(MovieNeighbour.KIND_CHOICES)
+        kind = request.query_params.get('kind')
+        if kind not in kinds:
+            kind = MovieNeighbour.RATINGS
+        movies = Movie.objects.filter(
+            neighbour_of__movie__slug=slug,
+            neighbour_of__kind=kind
+        ).only('id', 'title', 'year', 'average_rating', 'slug').annotate(
+            score=F('neighbour_of__score')).order_by('-score')
+        serializer = serializers.SimilarMovieSerializer(movies, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['get'], detail=True, url_path='stats')
+    @conditional_get('get_detail_validators')
+    def stats(self, request, slug=None):
+        """Return rating statistics of the movie."""
+        histogram = Movie.objects.filter(slug=slug).values_list(
+            'rating_histogram', flat=True).first()
+        if histogram is None:
+            raise NotFound()
+        return Response(rating_stats(histogram))
+
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'add_rating':
             return serializers.ManageRatingSerializer
         elif self.action == 'create':
             return serializers.CreateMovieSerializer
+        elif self.action == 'bulk':
+            return serializers.BulkMovieSerializer
 
         return self.serializer_class
+
+
+class CacheStatsView(APIView):
+    """View for response cache hits and misses."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(cache.stats())
+
+
+class PoolStatsView(APIView):
+    """View for database connection pool statistics of the serving process."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': pool.stats()})
+
+
+class MetricsView(APIView):
+    """View for performance metrics of endpoints in Prometheus text format."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class ProfileListView(APIView):
+    """View for list of saved request profiles, newest first."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+    fields = ['id', 'created', 'reason', 'method', 'path', 'view', 'status',
+              'duration_ms', 'query_count', 'query_duration_ms']
+
+    def get(self, request):
+        data = []
+        for profile_id in profiling.list_profiles():
+            profile = profiling.load_profile(profile_id)
+            if profile is not None:
+                data.append({field: profile[field] for field in self.fields})
+        return Response(data)
+
+
+class ProfileView(APIView):
+    """View for saved request profile with its SQL queries and report."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+
+    def get(self, request, profile_id):
+        profile = profiling.load_profile(profile_id)
+        if profile is None:
+            raise NotFound()
+        return Response(profile)
+
+
+class ProfileDownloadView(APIView):
+    """View for cProfile file of saved request profile."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdmin]
+
+    def get(self, request, profile_id):
+        path = profiling.profile_path(profile_id, 'prof')
+        if path is None or not os.path.exists(path):
+            raise NotFound()
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof')
+
+
+class AutocompleteView(APIView):
+    """List movies and artists with a word starting with `q`, most popular first."""
+    default_limit = 10
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), autocomplete.TOP_SIZE)
+        return Response(autocomplete.search(request.query_params.get('q', ''), limit))
@@ -0,0 +1,119 @@
+"""
+Pagination for movie API.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import BooleanField, F, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowValue(Func):
+    """Row constructor `(a, b)`."""
+    template = '(%(expressions)s)'
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over (ordering value, id).
+    Next page is selected with a row comparison on the last seen row instead
+    of OFFSET, so with a matching index deep pages cost the same as the first.
+    View returns (ordering expression, descending) from `get_keyset_ordering`.
+    Pages are model instances or dicts of `values()` querysets.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        expression, self.descending = view.get_keyset_ordering()
+
+        queryset = queryset.annotate(keyset_value=expression)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            value, last_id = cursor
+            queryset = queryset.filter(Func(
+                RowValue(F('keyset_value'), F('id')),
+                RowValue(Value(value), Value(last_id)),
+                template='%(expressions)s',
+                arg_joiner=' < ' if self.descending else ' > ',
+                output_field=BooleanField()
+            ))
+        if self.descending:
+            queryset = queryset.order_by(F('keyset_value').desc(), F('id').desc())
+        else:
+            queryset = queryset.order_by(F('keyset_value').asc(), F('id').asc())
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return (value, id) from cursor query parameter."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return value, int(last_id)
+        except (binascii.Error, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, value, last_id):
+        """Return cursor pointing after the row with given value and id."""
+        data = json.dumps([value, last_id], default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            cursor = self.encode_cursor(last['keyset_value'], last['id'])
+        else:
+            cursor = self.encode_cursor(last.keyset_value, last.id)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class RatingCursorPagination(CursorPagination):
+    """Cursor pagination of movie ratings, newest first."""
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = '-id'
@@ -4,11 +4,12 @@ Serializers for movie API
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
-from core.models import Movie, Genre, Rating, Artist
+from core.metrics import TimedSerializerMixin
+from core.models import Movie, Genre, Rating, Artist, Chart, ChartEntry
 from user.serializers import BasicUserSerializer
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for genre object"""
     
     class Meta:
@@ -16,7 +17,7 @@ class GenreSerializer(serializers.ModelSerializer):
         fields = ['genre']
 
 
-class ArtistSerializer(serializers.ModelSerializer):
+class ArtistSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for artist object"""
 
     class Meta:
@@ -24,7 +25,14 @@ class ArtistSerializer(serializers.ModelSerializer):
         fields = ['first_name', 'last_name']
 
 
-class BasicMovieSerializer(serializers.ModelSerializer):
+class SearchArtistSerializer(ArtistSerializer):
+    """Serializer for artists in search results."""
+
+    class Meta(ArtistSerializer.Meta):
+        fields = ArtistSerializer.Meta.fields + ['slug']
+
+
+class BasicMovieSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Basic movie serializer for listing movies."""
 
     class Meta:
@@ -32,6 +40,60 @@ class BasicMovieSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'year', 'average_rating']
         read_only_fields = ['id']
 
+class FilmographyMovieSerializer(BasicMovieSerializer):
+    """Serializer for movies of artist with their role: directed, starred or both."""
+
+    role = serializers.CharField(read_only=True)
+
+    class Meta(BasicMovieSerializer.Meta):
+        fields = BasicMovieSerializer.Meta.fields + ['slug', 'role']
+
+
+class SimilarMovieSerializer(BasicMovieSerializer):
+    """Serializer for similar movie with its similarity score."""
+
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BasicMovieSerializer.Meta):
+        fields = BasicMovieSerializer.Meta.fields + ['slug', 'score']
+
+
+class RecommendedMovieSerializer(BasicMovieSerializer):
+    """Serializer for movie recommended to user with predicted rating."""
+
+    predicted_rating = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta(BasicMovieSerializer.Meta):
+        fields = BasicMovieSerializer.Meta.fields + ['slug', 'predicted_rating']
+
+
+class ChartMovieSerializer(BasicMovieSerializer):
+    """Serializer for movie in chart."""
+
+    class Meta(BasicMovieSerializer.Meta):
+        fields = BasicMovieSerializer.Meta.fields + ['slug', 'rating_count']
+
+
+class ChartEntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for movie in chart with its Bayesian average score."""
+
+    movie = ChartMovieSerializer(read_only=True)
+
+    class Meta:
+        model = ChartEntry
+        fields = ['score', 'movie']
+
+
+class ChartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for chart."""
+
+    genre = serializers.CharField(source='genre.genre', read_only=True, default=None)
+
+    class Meta:
+        model = Chart
+        fields = ['kind', 'genre', 'decade', 'mean', 'min_votes', 'refreshed']
+
+
 class CreateMovieSerializer(BasicMovieSerializer):
     """Serializer for creating movie."""
 
@@ -40,6 +102,17 @@ class CreateMovieSerializer(BasicMovieSerializer):
         read_only_fields = BasicMovieSerializer.Meta.read_only_fields + ['average_rating']
 
 
+class BulkMovieSerializer(CreateMovieSerializer):
+    """Serializer for validating movie with genres and artists in bulk create."""
+
+    genre = GenreSerializer(many=True, required=False)
+    director = ArtistSerializer(many=True, required=False)
+    actors = ArtistSerializer(many=True, required=False)
+
+    class Meta(CreateMovieSerializer.Meta):
+        fields = CreateMovieSerializer.Meta.fields + ['genre', 'director', 'actors']
+
+
 class MovieSerializer(BasicMovieSerializer):
     """Serializer for movie object"""
 
@@ -62,7 +135,7 @@ class MovieSerializer(BasicMovieSerializer):
                  ['created', 'updated']
 
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for listing ratings in movie view."""
 
     user = BasicUserSerializer()
@@ -73,7 +146,7 @@ class RatingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user']
 
 
-class ManageRatingSerializer(serializers.ModelSerializer):
+class ManageRatingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for adding and editing rating."""
 
     class Meta:
@@ -0,0 +1,166 @@
+"""
+Tests for the movie API.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from core.models import Artist, Genre, Movie, Rating
+
+
+# numbers of rows served by endpoints, queries must not grow with them
+SIZES = [2, 7]
+
+
+def create_user(number):
+    return get_user_model().objects.create_user(
+        email=f'user{number}@example.com', password='password', name=f'user{number}')
+
+
+def create_movie(number, director, actor, genres):
+    movie = Movie.objects.create(
+        title=f'Movie {number}', year=2000 + number, slug=f'movie-{number}')
+    movie.genre.add(*genres)
+    movie.director.add(director)
+    movie.actors.add(actor)
+    return movie
+
+
+class QueryCountTests(TestCase):
+    """Number of queries of movie and artist endpoints whatever the number of rows."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.director = Artist.objects.create(
+            first_name='Jan', last_name='Kowalski', slug='jan-kowalski')
+        self.actor = Artist.objects.create(first_name='Anna', last_name='Nowak', slug='anna-nowak')
+        self.genres = [Genre.objects.create(genre='drama'), Genre.objects.create(genre='comedy')]
+        self.movies = []
+        self.users = []
+
+    def add_movies(self, count):
+        """Add movies up to count, every one with genres, director and actor."""
+        for number in range(len(self.movies), count):
+            self.movies.append(create_movie(number, self.director, self.actor, self.genres))
+
+    def add_ratings(self, movie, count):
+        """Add ratings of movie by new users up to count."""
+        while movie.rating_set.count() < count:
+            user = create_user(len(self.users))
+            self.users.append(user)
+            Rating.objects.create(movie_id=movie, user=user, rating=5, comment='Good')
+
+    def get(self, url, queries):
+        """Return data of response to GET request run with queries, not served from cache."""
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_movie_list(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_movies(size)
+                data = self.get('/api/movie/movies/', 5)
+                self.assertEqual(len(data['results']), size)
+
+    def test_movie_detail(self):
+        self.add_movies(1)
+        movie = self.movies[0]
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_ratings(movie, size)
+                data = self.get(f'/api/movie/movies/{movie.slug}/', 6)
+                self.assertEqual(len(data['Ratings']), size)
+
+    def test_movie_ratings(self):
+        self.add_movies(1)
+        movie = self.movies[0]
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_ratings(movie, size)
+                data = self.get(f'/api/movie/movies/{movie.slug}/ratings/', 2)
+                self.assertEqual(len(data['results']), size)
+
+    def test_artist_detail(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_movies(size)
+                data = self.get(f'/api/movie/artist/{self.director.slug}/', 3)
+                self.assertEqual(len(data['Directed']), size)
+
+    def test_artist_movies(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_movies(size)
+                data = self.get(f'/api/movie/artist/{self.actor.slug}/movies/?role=starred', 2)
+                self.assertEqual(len(data['results']), size)
+
+    def test_artist_search(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                for number in range(Artist.objects.filter(last_name='Wiśniewska').count(), size):
+                    Artist.objects.create(
+                        first_name=f'Ewa{number}', last_name='Wiśniewska', slug=f'ewa-{number}')
+                data = self.get('/api/movie/artists/?search=Wiśniewska', 1)
+                self.assertEqual(len(data['results']), size)
+
+
+class ConditionalGetTests(TestCase):
+    """ETags of movie endpoints change with everything their responses show."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(0)
+        self.movie = Movie.objects.create(title='Movie', year=2000, slug='movie')
+        self.rating = Rating.objects.create(
+            movie_id=self.movie, user=self.user, rating=5, comment='Good')
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        return response['ETag']
+
+    def test_endpoints_have_own_etags(self):
+        urls = ['/api/movie/movies/movie/', '/api/movie/movies/movie/ratings/',
+                '/api/movie/movies/movie/stats/']
+        self.assertEqual(len({self.etag(url) for url in urls}), len(urls))
+
+    def test_renamed_user(self):
+        url = '/api/movie/movies/movie/ratings/'
+        etag = self.etag(url)
+        self.user.name = 'renamed'
+        self.user.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_edited_comment(self):
+        url = '/api/movie/movies/movie/ratings/'
+        etag = self.etag(url)
+        self.rating.comment = 'Very good'
+        self.rating.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+
+class ResponseCacheTests(TestCase):
+    """Cached movie responses change with everything they show."""
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.user = create_user(0)
+        self.movie = Movie.objects.create(title='Movie', year=2000, slug='movie')
+        Rating.objects.create(movie_id=self.movie, user=self.user, rating=5, comment='Good')
+
+    def test_renamed_user(self):
+        url = '/api/movie/movies/movie/'
+        self.assertEqual(self.client.get(url).json()['Ratings'][0]['user']['name'], 'user0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.name = 'renamed'
+            self.user.save()
+        self.assertEqual(self.client.get(url).json()['Ratings'][0]['user']['name'], 'renamed')
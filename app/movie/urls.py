@@ -6,7 +6,8 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from movie import movie_views, artist_views
+from core.concurrent import async_patterns
+from movie import movie_views, artist_views, chart_views
 
 
 router = DefaultRouter()
@@ -14,8 +15,25 @@ router.register('movies', movie_views.MovieViewSet)
 
 app_name = 'movie'
 
-urlpatterns = [
+urlpatterns = async_patterns([
     path('', include(router.urls)),
+    path('artists/', artist_views.SearchArtistView.as_view(), name='artists'),
     path('artist/<str:slug>/', artist_views.RetrieveArtistView.as_view(), name='artist'),
-    path('create-artist/', artist_views.CreateArtistView.as_view(), name='create-artist')
-]
+    path('artist/<str:slug>/movies/', artist_views.ArtistMoviesView.as_view(), name='artist-movies'),
+    path('create-artist/', artist_views.CreateArtistView.as_view(), name='create-artist'),
+    path('autocomplete/', movie_views.AutocompleteView.as_view(), name='autocomplete'),
+    path('cache-stats/', movie_views.CacheStatsView.as_view(), name='cache-stats'),
+    path('pool-stats/', movie_views.PoolStatsView.as_view(), name='pool-stats'),
+    path('metrics/', movie_views.MetricsView.as_view(), name='metrics'),
+    path('profiles/', movie_views.ProfileListView.as_view(), name='profiles'),
+    path('profiles/<str:profile_id>/', movie_views.ProfileView.as_view(), name='profile'),
+    path('profiles/<str:profile_id>/download/', movie_views.ProfileDownloadView.as_view(),
+         name='profile-download'),
+    path('charts/', chart_views.ListChartView.as_view(), name='charts'),
+    path('charts/overall/', chart_views.ChartView.as_view(),
+         {'kind': 'overall'}, name='chart-overall'),
+    path('charts/genre/<str:value>/', chart_views.ChartView.as_view(),
+         {'kind': 'genre'}, name='chart-genre'),
+    path('charts/decade/<int:value>/', chart_views.ChartView.as_view(),
+         {'kind': 'decade'}, name='chart-decade'),
+])
@@ -5,8 +5,10 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.metrics import TimedSerializerMixin
 
-class BasicUserSerializer(serializers.ModelSerializer):
+
+class BasicUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user in ratings view."""
 
     class Meta:
@@ -33,7 +35,7 @@ class UserSerializer(BasicUserSerializer):
         if password:
             user.set_password(password)
             user.save()
-        
+
         return user
 
 
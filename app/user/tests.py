@@ -0,0 +1,127 @@
+"""
+Tests for the user API.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import MIN_RATING, Movie, Rating, empty_histogram
+
+
+# numbers of ratings of the user, queries must not grow with them
+SIZES = [2, 7]
+
+
+class QueryCountTests(TestCase):
+    """Number of queries of user ratings endpoints whatever the number of ratings."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='password', name='user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.ratings = []
+
+    def add_ratings(self, count):
+        """Add ratings of the user of new movies up to count."""
+        for number in range(len(self.ratings), count):
+            movie = Movie.objects.create(
+                title=f'Movie {number}', year=2000 + number, slug=f'movie-{number}')
+            self.ratings.append(Rating.objects.create(
+                movie_id=movie, user=self.user, rating=5, comment='Good'))
+
+    def get(self, url, queries):
+        """Return data of response to GET request run with queries."""
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ratings_list(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_ratings(size)
+                data = self.get('/api/user/ratings/', 2)
+                self.assertEqual(len(data), size)
+
+    def test_rating_detail(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.add_ratings(size)
+                data = self.get(f'/api/user/ratings/{self.ratings[0].id}/', 2)
+                self.assertEqual(data['id'], self.ratings[0].id)
+
+
+class TokenInvalidationTests(TestCase):
+    """Cached tokens stop working once their user or token changes anywhere."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='password', name='user')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # user of the token is cached now
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 200)
+
+    def test_deleted_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 401)
+
+    def test_deactivated_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/user/me/').status_code, 401)
+
+    def test_changed_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.get(id=self.user.id).save()
+        with self.assertNumQueries(1):
+            self.client.get('/api/user/me/')
+
+
+class RatingTotalsTests(TestCase):
+    """Rating totals and histograms of movies follow saves and deletes of ratings."""
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f'user{number}@example.com', password='password', name=f'user{number}')
+            for number in range(3)
+        ]
+        self.movie = Movie.objects.create(title='Movie', year=2000, slug='movie')
+        self.ratings = [
+            Rating.objects.create(movie_id=self.movie, user=user, rating=rating)
+            for user, rating in zip(self.users, [4, 6, 8])
+        ]
+
+    def assertTotals(self, ratings):
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.rating_sum, sum(ratings))
+        self.assertEqual(self.movie.rating_count, len(ratings))
+        histogram = empty_histogram()
+        for rating in ratings:
+            histogram[rating - MIN_RATING] += 1
+        self.assertEqual(self.movie.rating_histogram, histogram)
+
+    def test_saves_of_stale_instances(self):
+        # both loaded before either saves, like concurrent PATCH requests
+        first = Rating.objects.get(id=self.ratings[0].id)
+        second = Rating.objects.get(id=self.ratings[0].id)
+        first.rating = 7
+        first.save()
+        second.rating = 9
+        second.save()
+        self.assertTotals([9, 6, 8])
+
+    def test_instance_delete(self):
+        self.ratings[0].delete()
+        self.assertTotals([6, 8])
+
+    def test_queryset_delete(self):
+        Rating.objects.filter(rating__gte=6).delete()
+        self.assertTotals([4])
@@ -6,6 +6,7 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
+from core.concurrent import async_patterns
 from user import views
 
 
@@ -14,9 +15,11 @@ router.register('ratings', views.RatingViewSet)
 
 app_name='user'
 
-urlpatterns = [
+urlpatterns = async_patterns([
     path('', include(router.urls)),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('logout/', views.LogoutView.as_view(), name='logout'),
     path('signup/', views.CreateUserView.as_view(), name='signup'),
     path('me/', views.ManageUserView.as_view(), name='me'),
-]
+    path('recommendations/', views.RecommendationView.as_view(), name='recommendations'),
+])
@@ -1,13 +1,22 @@
 """
 Views for the user API.
 """
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from rest_framework import viewsets, generics, authentication, permissions
+from rest_framework import viewsets, generics, permissions, status
+from rest_framework.views import APIView
 
+from rest_framework.response import Response
+
+from django.db.models import Count, Max
+
+from core.authentication import CachedTokenAuthentication, is_expired
+from core.conditional import conditional_get, make_etag
+from core.recommendations import recommend
 from user.serializers import AuthTokenSerializer, UserSerializer
-from movie.serializers import ManageRatingSerializer
-from core.models import Rating
+from movie.serializers import ManageRatingSerializer, RecommendedMovieSerializer
+from core.models import Movie, Rating, RATING_ORDERING
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -16,15 +25,35 @@ class CreateUserView(generics.CreateAPIView):
 
 
 class CreateTokenView(ObtainAuthToken):
-    """Create new token for user."""
+    """Create new token for user, replacing the expired one."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        if not created and is_expired(token.created):
+            token.delete()
+            token = Token.objects.create(user=user)
+        return Response({'token': token.key})
+
+
+class LogoutView(APIView):
+    """Delete token of the authenticated user."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        request.auth.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -37,8 +66,75 @@ class RatingViewSet(viewsets.ModelViewSet):
     serializer_class = ManageRatingSerializer
     http_method_names = ['get', 'patch']
     queryset = Rating.objects.all()
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         return Rating.objects.filter(user_id=self.request.user.id)
+
+    def get_list_validators(self, request):
+        """Return ETag and Last-Modified of user's ratings from aggregates."""
+        stats = self.get_queryset().aggregate(
+            last_modified=Max('modified'), count=Count('id'))
+        etag = make_etag(
+            'ratings', request.user.id, stats['count'], stats['last_modified'])
+        return etag, stats['last_modified']
+
+    def get_detail_validators(self, request, pk):
+        """Return ETag and Last-Modified of user's rating."""
+        try:
+            modified = self.get_queryset().filter(pk=pk).values_list(
+                'modified', flat=True).first()
+        except ValueError:
+            modified = None
+        if modified is None:
+            return None, None
+        return make_etag('rating', pk, modified), modified
+
+    @conditional_get('get_list_validators')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('get_detail_validators')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class RecommendationView(generics.GenericAPIView):
+    """
+    List movies recommended for the authenticated user from factors of their
+    ratings, best rated movies for users without trained factors.
+    """
+    serializer_class = RecommendedMovieSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    default_count = 20
+    max_count = 100
+
+    def get(self, request):
+        try:
+            count = int(request.query_params.get('count', self.default_count))
+        except ValueError:
+            count = self.default_count
+        count = min(max(count, 1), self.max_count)
+
+        fields = ['id', 'title', 'year', 'average_rating', 'slug']
+        # ask for more in case some movies were deleted since training
+        recommended = recommend(request.user.id, count * 2)
+        if recommended is None:
+            movies = Movie.objects.only(*fields).exclude(
+                rating__user=request.user
+            ).order_by(RATING_ORDERING.desc(), '-id')[:count]
+            for movie in movies:
+                movie.predicted_rating = None
+        else:
+            found = Movie.objects.only(*fields).in_bulk(
+                [movie_id for movie_id, _ in recommended])
+            movies = []
+            for movie_id, predicted_rating in recommended:
+                if movie_id in found and len(movies) < count:
+                    found[movie_id].predicted_rating = predicted_rating
+                    movies.append(found[movie_id])
+
+        serializer = self.get_serializer(movies, many=True)
+        return Response(serializer.data)